@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Compile system_prompts.yaml into system_prompts_compiled.py.
+
+At startup load_system_prompt() imports the compiled module instead of
+parsing YAML, as long as it was built from the same file (path and mtime).
+Run this at deploy time, after the prompts file is in place:
+
+    python build_prompts.py [--source system_prompts.yaml]
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from config import read_prompt_contents
+
+COMPILED_MODULE = Path(__file__).resolve().parent / "system_prompts_compiled.py"
+
+
+def build(source: Path) -> Path:
+    """Write the compiled prompts module for the given YAML file."""
+    prompts = read_prompt_contents(str(source))
+    source_file = os.path.relpath(source.resolve(), COMPILED_MODULE.parent)
+
+    COMPILED_MODULE.write_text(
+        f'"""Generated by build_prompts.py from {source_file}. Do not edit."""\n'
+        "\n"
+        f"SOURCE_FILE = {source_file!r}\n"
+        f"SOURCE_MTIME_NS = {source.stat().st_mtime_ns}\n"
+        "\n"
+        f"SYSTEM_PROMPTS = {prompts!r}\n",
+        encoding="utf-8"
+    )
+    return COMPILED_MODULE
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", default="system_prompts.yaml", help="Prompts YAML file to compile")
+    args = parser.parse_args()
+
+    output = build(Path(args.source))
+    print(f"Compiled {args.source} -> {output}")
+
+
+if __name__ == "__main__":
+    main()
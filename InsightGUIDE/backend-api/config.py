@@ -1,102 +1,212 @@
+import functools
 import os
-import yaml
 from pathlib import Path
-from typing import Dict, Any, Optional
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 import logging
 
+from utils import format_file_size
+
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _yaml_safe_loader() -> Any:
+    """Pick the YAML loader on first use, so yaml is only imported when a prompt file is parsed."""
+    try:
+        # libyaml-backed loader; bundled with the PyYAML wheels
+        from yaml import CSafeLoader
+        return CSafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+        logger.warning(
+            "PyYAML was built without libyaml; falling back to the pure-Python SafeLoader. "
+            "Reinstall PyYAML with libyaml available for faster prompt loading."
+        )
+        return SafeLoader
 
-class Config(BaseModel):
-    """Application configuration model with validation."""
-    
-    model_config = ConfigDict(
-        env_prefix="",
-        case_sensitive=False,
-        validate_assignment=True,
-        extra="forbid"
-    )
-    
-    mistral_api_key: str = Field(..., min_length=1)
-    openai_api_key: str = Field(..., min_length=1)
+
+_VALID_LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def validate_log_level(v: str) -> str:
+    """Validate log level is one of the allowed values."""
+    if v.upper() not in _VALID_LOG_LEVELS:
+        raise ValueError(f'log_level must be one of {list(_VALID_LOG_LEVELS)}')
+    return v.upper()
+
+
+def validate_frontend_url(v: str) -> str:
+    """Validate frontend URL format."""
+    if not v.startswith(('http://', 'https://')):
+        raise ValueError('frontend_url must start with http:// or https://')
+    return v
+
+
+def validate_openai_api_host(v: Optional[str]) -> Optional[str]:
+    """Validate OpenAI API host format."""
+    if v and not v.startswith(('http://', 'https://')):
+        raise ValueError('openai_api_host must start with http:// or https://')
+    return v
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Application configuration, validated once on construction."""
+
+    mistral_api_key: str
+    openai_api_key: str
+    model: str
+    system_prompt: str
     openai_api_host: Optional[str] = None
-    model: str = Field(..., min_length=1)
-    frontend_url: str = Field(default="http://localhost:9002")
-    system_prompt_file: str = Field(default="system_prompts.yaml")
-    system_prompt_key: str = Field(default="paper-assistant-prompt")
-    system_prompt: str = Field(..., min_length=1)
-    max_file_size: int = Field(default=50 * 1024 * 1024, gt=0)
-    save_extracted_content: bool = Field(default=False)
-    upload_dir: str = Field(default="uploads")
-    output_dir: str = Field(default="outputs")
-    ocr_timeout_ms: int = Field(default=300_000, gt=0)
-    port: int = Field(default=8000, ge=1, le=65535)
-    host: str = Field(default="0.0.0.0")
-    log_level: str = Field(default="INFO")
-
-    @field_validator('log_level')
-    @classmethod
-    def validate_log_level(cls, v: str) -> str:
-        """Validate log level is one of the allowed values."""
-        valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-        if v.upper() not in valid_levels:
-            raise ValueError(f'log_level must be one of {valid_levels}')
-        return v.upper()
-    
-    @field_validator('frontend_url')
-    @classmethod
-    def validate_frontend_url(cls, v: str) -> str:
-        """Validate frontend URL format."""
-        if not v.startswith(('http://', 'https://')):
-            raise ValueError('frontend_url must start with http:// or https://')
-        return v
-    
-    @field_validator('openai_api_host')
-    @classmethod
-    def validate_openai_api_host(cls, v: Optional[str]) -> Optional[str]:
-        """Validate OpenAI API host format."""
-        if v and not v.startswith(('http://', 'https://')):
-            raise ValueError('openai_api_host must start with http:// or https://')
-        return v
+    frontend_url: str = "http://localhost:9002"
+    system_prompt_file: str = "system_prompts.yaml"
+    system_prompt_key: str = "paper-assistant-prompt"
+    max_file_size: int = 50 * 1024 * 1024
+    save_extracted_content: bool = False
+    upload_dir: str = "uploads"
+    output_dir: str = "outputs"
+    ocr_timeout_ms: int = 300_000
+    port: int = 8000
+    host: str = "0.0.0.0"
+    log_level: str = "INFO"
+    # Derived once here, so error paths don't re-format the static limit
+    max_file_size_str: str = field(init=False, repr=False)
+    # frontend_url may list several comma-separated origins for CORS
+    frontend_urls: Tuple[str, ...] = field(init=False, repr=False)
 
+    def __post_init__(self) -> None:
+        for name in ("mistral_api_key", "openai_api_key", "model", "system_prompt"):
+            if not getattr(self, name):
+                raise ValueError(f"{name} must not be empty")
+        if self.max_file_size <= 0:
+            raise ValueError("max_file_size must be greater than 0")
+        if self.ocr_timeout_ms <= 0:
+            raise ValueError("ocr_timeout_ms must be greater than 0")
+        if not 1 <= self.port <= 65535:
+            raise ValueError("port must be between 1 and 65535")
 
-def load_system_prompt(prompt_file: str, prompt_key: str) -> str:
-    """Load system prompt from YAML file."""
-    prompt_path = Path(prompt_file)
+        # Frozen dataclass: normalized values have to bypass __setattr__
+        object.__setattr__(self, "log_level", validate_log_level(self.log_level))
+        frontend_urls = tuple(
+            validate_frontend_url(url.strip())
+            for url in self.frontend_url.split(",")
+            if url.strip()
+        )
+        if not frontend_urls:
+            raise ValueError("frontend_url must contain at least one URL")
+        object.__setattr__(self, "frontend_urls", frontend_urls)
+        object.__setattr__(self, "openai_api_host", validate_openai_api_host(self.openai_api_host))
+        object.__setattr__(self, "max_file_size_str", format_file_size(self.max_file_size))
 
-    try:
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            prompts_config = yaml.safe_load(f)
-            
-        if not prompts_config or "prompts" not in prompts_config:
-            raise ValueError(f"Invalid prompt file structure in {prompt_file}")
-            
-        if prompt_key not in prompts_config["prompts"]:
-            available_keys = list(prompts_config["prompts"].keys())
-            raise ValueError(
-                f"Prompt key '{prompt_key}' not found in {prompt_file}. "
-                f"Available keys: {available_keys}"
-            )
-            
-        content = prompts_config["prompts"][prompt_key].get("content", "")
-        if not content:
-            raise ValueError(f"Empty content for prompt key '{prompt_key}' in {prompt_file}")
-            
-        logger.info(f"Successfully loaded system prompt '{prompt_key}' from {prompt_file}")
-        return content
 
+def _prompt_entry_content(entry: Any) -> Optional[str]:
+    """Content of one prompt entry; ``None`` marks a malformed entry.
+
+    Malformed entries only fail when their key is requested, so one bad
+    sibling doesn't break every other prompt in the file.
+    """
+    if entry is None:
+        return ""
+    if not isinstance(entry, dict):
+        return None
+    return entry.get("content", "")
+
+
+def read_prompt_contents(prompt_file: str) -> Dict[str, Optional[str]]:
+    """Parse a prompts YAML file into a ``{prompt_key: content}`` mapping.
+
+    Entries that aren't mappings are kept as ``None`` so they can be reported
+    when requested.
+    """
+    # Deferred: with compiled prompts in place, the app never needs yaml at all
+    import yaml
+
+    try:
+        with open(prompt_file, 'r', encoding='utf-8') as f:
+            prompts_config = yaml.load(f, Loader=_yaml_safe_loader())
     except FileNotFoundError as e:
         raise ValueError(f"System prompt file {prompt_file} not found") from e
     except yaml.YAMLError as e:
         raise ValueError(f"Error parsing YAML file {prompt_file}: {e}")
 
+    if (
+        not isinstance(prompts_config, dict)
+        or not isinstance(prompts_config.get("prompts"), dict)
+    ):
+        raise ValueError(f"Invalid prompt file structure in {prompt_file}")
+
+    return {
+        key: _prompt_entry_content(entry)
+        for key, entry in prompts_config["prompts"].items()
+    }
+
+
+@functools.lru_cache(maxsize=16)
+def _read_prompt_contents_cached(prompt_file: str, mtime_ns: int) -> Dict[str, Optional[str]]:
+    """Cached YAML parse; the mtime in the key makes edits invalidate the entry."""
+    return read_prompt_contents(prompt_file)
+
+
+def _load_compiled_prompts(prompt_file: str, mtime_ns: int) -> Optional[Dict[str, Optional[str]]]:
+    """Return prompts from ``system_prompts_compiled`` if it was built from this exact file."""
+    try:
+        import system_prompts_compiled as compiled
+    except ImportError:
+        return None
+
+    source_path = Path(compiled.__file__).parent / compiled.SOURCE_FILE
+    if compiled.SOURCE_MTIME_NS != mtime_ns or source_path.resolve() != Path(prompt_file).resolve():
+        logger.debug(f"Ignoring stale compiled prompts for {prompt_file}")
+        return None
+    return compiled.SYSTEM_PROMPTS
+
+
+def _get_prompt_contents(prompt_file: str) -> Dict[str, Optional[str]]:
+    try:
+        mtime_ns = os.stat(prompt_file).st_mtime_ns
+    except FileNotFoundError as e:
+        # Fail before any cache lookup or YAML import
+        raise ValueError(f"System prompt file {prompt_file} not found") from e
+
+    compiled_prompts = _load_compiled_prompts(prompt_file, mtime_ns)
+    if compiled_prompts is not None:
+        return compiled_prompts
+    return _read_prompt_contents_cached(prompt_file, mtime_ns)
+
+
+def load_system_prompt(prompt_file: str, prompt_key: str) -> str:
+    """Load system prompt from YAML file (or its compiled shadow, see build_prompts.py)."""
+    prompts = _get_prompt_contents(prompt_file)
+
+    if prompt_key not in prompts:
+        available_keys = list(prompts.keys())
+        raise ValueError(
+            f"Prompt key '{prompt_key}' not found in {prompt_file}. "
+            f"Available keys: {available_keys}"
+        )
+
+    content = prompts[prompt_key]
+    if content is None:
+        raise ValueError(f"Invalid prompt entry {prompt_key!r} in {prompt_file}")
+    if not content:
+        raise ValueError(f"Empty content for prompt key '{prompt_key}' in {prompt_file}")
 
+    logger.info(f"Successfully loaded system prompt '{prompt_key}' from {prompt_file}")
+    return content
+
+
+@functools.lru_cache(maxsize=1)
 def load_config() -> Config:
-    """Load and validate application configuration."""
+    """Load and validate application configuration.
+
+    The result is cached for the lifetime of the process; call
+    ``load_config.cache_clear()`` to force a reload.
+    """
 
     load_dotenv()
+    # Single consistent snapshot of the environment for all reads below
+    env = os.environ.copy()
     
     def safe_int_parse(value: str, default: int) -> int:
         if not value:
@@ -109,21 +219,21 @@ def load_config() -> Config:
             return default
     
     config_data = {
-        "mistral_api_key": os.getenv("MISTRAL_API_KEY"),
-        "openai_api_key": os.getenv("OPENAI_API_KEY"),
-        "openai_api_host": os.getenv("OPENAI_API_HOST"),
-        "model": os.getenv("MODEL"),
-        "frontend_url": os.getenv("FRONTEND_URL", "http://localhost:9002"),
-        "system_prompt_file": os.getenv("SYSTEM_PROMPT_FILE", "system_prompts.yaml"),
-        "system_prompt_key": os.getenv("SYSTEM_PROMPT_KEY", "paper-assistant-prompt"),
-        "max_file_size": safe_int_parse(os.getenv("MAX_FILE_SIZE", ""), 50 * 1024 * 1024),
-        "save_extracted_content": os.getenv("SAVE_EXTRACTED_CONTENT", "false").lower() in ("true", "1", "yes"),
-        "upload_dir": os.getenv("UPLOAD_DIR", "uploads"),
-        "output_dir": os.getenv("OUTPUT_DIR", "outputs"),
-        "ocr_timeout_ms": safe_int_parse(os.getenv("OCR_TIMEOUT_MS", ""), 300_000),
-        "port": safe_int_parse(os.getenv("PORT", ""), 8000),
-        "host": os.getenv("HOST", "0.0.0.0"),
-        "log_level": os.getenv("LOG_LEVEL", "INFO"),
+        "mistral_api_key": env.get("MISTRAL_API_KEY"),
+        "openai_api_key": env.get("OPENAI_API_KEY"),
+        "openai_api_host": env.get("OPENAI_API_HOST"),
+        "model": env.get("MODEL"),
+        "frontend_url": env.get("FRONTEND_URL", "http://localhost:9002"),
+        "system_prompt_file": env.get("SYSTEM_PROMPT_FILE", "system_prompts.yaml"),
+        "system_prompt_key": env.get("SYSTEM_PROMPT_KEY", "paper-assistant-prompt"),
+        "max_file_size": safe_int_parse(env.get("MAX_FILE_SIZE", ""), 50 * 1024 * 1024),
+        "save_extracted_content": env.get("SAVE_EXTRACTED_CONTENT", "false").lower() in ("true", "1", "yes"),
+        "upload_dir": env.get("UPLOAD_DIR", "uploads"),
+        "output_dir": env.get("OUTPUT_DIR", "outputs"),
+        "ocr_timeout_ms": safe_int_parse(env.get("OCR_TIMEOUT_MS", ""), 300_000),
+        "port": safe_int_parse(env.get("PORT", ""), 8000),
+        "host": env.get("HOST", "0.0.0.0"),
+        "log_level": env.get("LOG_LEVEL", "INFO"),
     }
     
     config_data = {k: v for k, v in config_data.items() if v is not None}
@@ -2,15 +2,15 @@ import logging
 import ipaddress
 import socket
 import asyncio
-from contextlib import asynccontextmanager
-from typing import Optional, Set, Tuple
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Optional, Set, Tuple, Union
 from urllib.parse import urlparse, unquote
 
 import httpx
 import uvicorn
 from fastapi import FastAPI, File, UploadFile, HTTPException, status, Depends, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
 
 from config import Config, load_config
 from exceptions import (
@@ -21,12 +21,20 @@ from exceptions import (
 )
 from models import PDFProcessResponse, OCRResponse, ErrorResponse, HealthResponse, PDFURLRequest
 from services import APIClientService, OCRService, InsightsService, FileService
-from utils import setup_logging, validate_file_size, format_file_size
+from utils import (
+    setup_logging,
+    validate_file_size,
+    format_file_size,
+    has_pdf_signature,
+    PDF_SIGNATURE_WINDOW,
+)
 
 logger = logging.getLogger(__name__)
 
-ALLOWED_PDF_CONTENT_TYPES = {"application/pdf", "application/x-pdf"}
+ALLOWED_PDF_CONTENT_TYPES = frozenset({"application/pdf", "application/x-pdf"})
 ALLOWED_URL_CONTENT_TYPES = ALLOWED_PDF_CONTENT_TYPES | {"application/octet-stream"}
+PDF_FILE_SUFFIXES = (".pdf",)
+UPLOAD_CHUNK_SIZE = 1 << 20
 
 
 class AppState:
@@ -73,16 +81,14 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to initialize application: {e}")
         raise ConfigurationError(f"Application startup failed: {e}")
     finally:
+        if state.api_client_service is not None:
+            await state.api_client_service.aclose()
         logger.info("Shutting down InsightGUIDE API")
 
 
-# Load config early to get frontend URL for CORS
-try:
-    _early_config = load_config()
-    _frontend_origins = [_early_config.frontend_url]
-except Exception:
-    # Fallback if config loading fails
-    _frontend_origins = ["http://localhost:9002"]
+# Load config early to get frontend URLs for CORS (cached, reused by lifespan).
+# No fallback: a misconfigured deployment should fail at import, not serve a dev origin.
+_frontend_origins = list(load_config().frontend_urls)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -163,7 +169,7 @@ def _extract_filename_from_url(pdf_url: str) -> str:
     if not filename:
         filename = "document.pdf"
 
-    if not filename.lower().endswith(".pdf"):
+    if not filename.lower().endswith(PDF_FILE_SUFFIXES):
         filename = f"{filename}.pdf"
 
     return filename
@@ -247,7 +253,11 @@ async def _validate_https_pdf_url(pdf_url: str, validated_hosts: Optional[Set[st
     return parsed_url
 
 
-async def download_pdf_from_url(pdf_url: str, max_file_size: int) -> Tuple[str, bytes]:
+async def download_pdf_from_url(
+    pdf_url: str,
+    max_file_size: int,
+    max_file_size_str: str
+) -> Tuple[str, bytes]:
     """Download PDF bytes from URL and validate type and size constraints."""
     max_redirects = 5
     validated_hosts: Set[str] = set()
@@ -298,19 +308,29 @@ async def download_pdf_from_url(pdf_url: str, max_file_size: int) -> Tuple[str,
                             logger.warning(f"URL file too large: {format_file_size(content_length)}")
                             raise HTTPException(
                                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                                detail=f"File too large. Maximum size: {format_file_size(max_file_size)}"
+                                detail=f"File too large. Maximum size: {max_file_size_str}"
                             )
 
+                    signature_checked = False
                     async for chunk in response.aiter_bytes():
                         if not chunk:
                             continue
 
                         pdf_bytes_buffer.extend(chunk)
+                        # Reject non-PDFs as soon as the signature window has arrived
+                        if not signature_checked and len(pdf_bytes_buffer) >= PDF_SIGNATURE_WINDOW:
+                            if not has_pdf_signature(pdf_bytes_buffer):
+                                logger.warning(f"Downloaded file from URL is not a valid PDF: {pdf_url}")
+                                raise HTTPException(
+                                    status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail="File does not appear to be a valid PDF"
+                                )
+                            signature_checked = True
                         if not validate_file_size(len(pdf_bytes_buffer), max_file_size):
                             logger.warning(f"URL file too large while streaming: {format_file_size(len(pdf_bytes_buffer))}")
                             raise HTTPException(
                                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                                detail=f"File too large. Maximum size: {format_file_size(max_file_size)}"
+                                detail=f"File too large. Maximum size: {max_file_size_str}"
                             )
                     break
             else:
@@ -342,7 +362,7 @@ async def download_pdf_from_url(pdf_url: str, max_file_size: int) -> Tuple[str,
             detail="Downloaded file is empty"
         )
 
-    if not pdf_bytes.startswith(b"%PDF-"):
+    if not has_pdf_signature(pdf_bytes):
         logger.warning(f"Downloaded file from URL is not a valid PDF: {pdf_url}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -352,11 +372,59 @@ async def download_pdf_from_url(pdf_url: str, max_file_size: int) -> Tuple[str,
     return filename, pdf_bytes
 
 
+async def read_and_validate_pdf(upload: UploadFile, limit: int, limit_str: str) -> bytearray:
+    """Read an uploaded PDF in chunks, rejecting bad signatures and oversize files early."""
+    # The multipart parser records the spooled size, so known oversize uploads skip the read loop
+    if upload.size is not None and not validate_file_size(upload.size, limit):
+        logger.warning(f"File too large: {format_file_size(upload.size)}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: {limit_str}"
+        )
+
+    pdf_bytes_buffer = bytearray()
+
+    try:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            if not pdf_bytes_buffer and not has_pdf_signature(chunk):
+                logger.warning("File does not appear to be a valid PDF")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="File does not appear to be a valid PDF"
+                )
+
+            pdf_bytes_buffer.extend(chunk)
+            if not validate_file_size(len(pdf_bytes_buffer), limit):
+                logger.warning(f"File too large: exceeded {limit_str} while reading")
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File too large. Maximum size: {limit_str}"
+                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to read uploaded file: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to read uploaded file"
+        )
+
+    if not pdf_bytes_buffer:
+        logger.warning("File does not appear to be a valid PDF")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File does not appear to be a valid PDF"
+        )
+
+    # Returned as-is: callers only slice or base64 it, and bytes() would copy the whole upload
+    return pdf_bytes_buffer
+
+
 async def resolve_pdf_input(
     pdf_file: Optional[UploadFile],
     pdf_url: Optional[str],
     config: Config
-) -> Tuple[str, bytes]:
+) -> Tuple[str, Union[bytes, bytearray]]:
     """Resolve PDF input from either uploaded file or URL with shared validation."""
     if pdf_file and pdf_url:
         raise HTTPException(
@@ -371,7 +439,7 @@ async def resolve_pdf_input(
         )
 
     if pdf_url:
-        return await download_pdf_from_url(pdf_url.strip(), config.max_file_size)
+        return await download_pdf_from_url(pdf_url.strip(), config.max_file_size, config.max_file_size_str)
 
     if pdf_file is None:
         raise HTTPException(
@@ -386,38 +454,99 @@ async def resolve_pdf_input(
             detail="Invalid file type. Please upload a PDF file."
         )
 
-    if not pdf_file.filename or not pdf_file.filename.lower().endswith('.pdf'):
+    if not pdf_file.filename or not pdf_file.filename.lower().endswith(PDF_FILE_SUFFIXES):
         logger.warning(f"Invalid filename: {pdf_file.filename}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid filename. Please ensure the file has a .pdf extension."
         )
 
+    pdf_bytes = await read_and_validate_pdf(pdf_file, config.max_file_size, config.max_file_size_str)
+    return pdf_file.filename, pdf_bytes
+
+
+async def save_extracted_content_if_enabled(
+    file_service: FileService,
+    config: Config,
+    extracted_content: str,
+    source_filename: str
+) -> None:
+    """Save extracted content off the event loop when saving is enabled."""
+    if config.save_extracted_content:
+        await file_service.save_extracted_content_async(extracted_content, source_filename)
+
+
+async def save_and_generate_insights(
+    file_service: FileService,
+    insights_service: InsightsService,
+    config: Config,
+    extracted_content: str,
+    source_filename: str
+) -> str:
+    """Save extracted content (if enabled) while generating insights.
+
+    A failed save cancels the insights call so no LLM work continues for a
+    request that is already failing.
+    """
+    insights_task = asyncio.create_task(insights_service.generate_insights(extracted_content))
     try:
-        pdf_bytes = await pdf_file.read()
-    except Exception as e:
-        logger.error(f"Failed to read uploaded file: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to read uploaded file"
-        )
+        await save_extracted_content_if_enabled(file_service, config, extracted_content, source_filename)
+    except BaseException:
+        insights_task.cancel()
+        raise
+    return await insights_task
 
-    file_size = len(pdf_bytes)
-    if not validate_file_size(file_size, config.max_file_size):
-        logger.warning(f"File too large: {format_file_size(file_size)}")
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Maximum size: {format_file_size(config.max_file_size)}"
-        )
 
-    if not pdf_bytes.startswith(b'%PDF-'):
-        logger.warning("File does not appear to be a valid PDF")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File does not appear to be a valid PDF"
-        )
+def build_process_response(insights: str, source_filename: str) -> PDFProcessResponse:
+    """Build the insights response without re-validating the model.
+
+    model_construct skips the ``min_length=1`` constraint, so the one rule
+    that can actually fail is checked here.
+    """
+    if not insights:
+        raise AIInsightsError("AI model returned empty insights")
+    return PDFProcessResponse.model_construct(insights=insights, filename=source_filename)
+
+
+def build_ocr_response(extracted_content: str, source_filename: str) -> OCRResponse:
+    """Build the OCR response, rejecting empty output that model_construct would let through."""
+    if not extracted_content:
+        raise OCRProcessingError("No text could be extracted from the PDF")
+    return OCRResponse.model_construct(extracted_content=extracted_content, filename=source_filename)
 
-    return pdf_file.filename, pdf_bytes
+
+def _error_response(status_code: int, detail: str, error_type: str) -> Response:
+    """Serialize an ErrorResponse straight to JSON bytes via pydantic-core."""
+    return Response(
+        status_code=status_code,
+        content=ErrorResponse.model_construct(detail=detail, error_type=error_type).model_dump_json(),
+        media_type="application/json"
+    )
+
+
+def _sse_event(data: str, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Event, splitting multi-line data across data: fields."""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def insights_event_stream(chunks: AsyncGenerator[str, None], source_filename: str) -> AsyncIterator[str]:
+    """Relay streamed insights as SSE, ending with a done or error event."""
+    # aclosing: a client disconnect closes the upstream generator right away
+    async with aclosing(chunks):
+        try:
+            async for chunk in chunks:
+                yield _sse_event(chunk)
+        except AIInsightsError as e:
+            # Headers are already sent, so the failure has to travel in-band
+            yield _sse_event(str(e), event="error")
+            return
+        except Exception as e:
+            logger.error(f"Unexpected error while streaming insights: {e}", exc_info=True)
+            yield _sse_event("An unexpected error occurred while generating insights", event="error")
+            return
+    yield _sse_event(source_filename, event="done")
 
 
 # Exception handlers
@@ -425,39 +554,21 @@ async def resolve_pdf_input(
 async def pdf_insights_exception_handler(request: Request, exc: PDFInsightsError):
     """Handle custom application exceptions."""
     logger.error(f"Application error: {exc}")
-    return JSONResponse(
-        status_code=status.HTTP_400_BAD_REQUEST,
-        content=ErrorResponse(
-            detail=str(exc),
-            error_type=type(exc).__name__
-        ).model_dump()
-    )
+    return _error_response(status.HTTP_400_BAD_REQUEST, str(exc), type(exc).__name__)
 
 
 @app.exception_handler(ValueError)
 async def value_error_handler(request: Request, exc: ValueError):
     """Handle validation errors."""
     logger.error(f"Validation error: {exc}")
-    return JSONResponse(
-        status_code=status.HTTP_400_BAD_REQUEST,
-        content=ErrorResponse(
-            detail=str(exc),
-            error_type="ValidationError"
-        ).model_dump()
-    )
+    return _error_response(status.HTTP_400_BAD_REQUEST, str(exc), "ValidationError")
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected exceptions."""
     logger.error(f"Unexpected error: {exc}", exc_info=True)
-    return JSONResponse(
-        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        content=ErrorResponse(
-            detail="An unexpected error occurred",
-            error_type="InternalServerError"
-        ).model_dump()
-    )
+    return _error_response(status.HTTP_500_INTERNAL_SERVER_ERROR, "An unexpected error occurred", "InternalServerError")
 
 
 # API Routes
@@ -469,7 +580,7 @@ async def general_exception_handler(request: Request, exc: Exception):
 )
 async def health_check():
     """Check API health status."""
-    return HealthResponse(status="healthy", version="1.0.0")
+    return HealthResponse.model_construct(status="healthy", version="1.0.0")
 
 
 @app.post(
@@ -502,18 +613,12 @@ async def process_pdf_endpoint(
         # Extract content using OCR
         extracted_content = await ocr_service.process_pdf(source_filename, pdf_bytes)
         
-        # Save extracted content if enabled
-        if config.save_extracted_content:
-            file_service.save_extracted_content(extracted_content, source_filename)
-        
-        # Generate insights
-        insights = await insights_service.generate_insights(extracted_content)
-        
-        return PDFProcessResponse(
-            insights=insights,
-            filename=source_filename
+        insights = await save_and_generate_insights(
+            file_service, insights_service, config, extracted_content, source_filename
         )
         
+        return build_process_response(insights, source_filename)
+        
     except (OCRProcessingError, AIInsightsError):
         raise
     except Exception as e:
@@ -524,6 +629,52 @@ async def process_pdf_endpoint(
         )
 
 
+@app.post(
+    "/api/process-pdf/stream",
+    response_class=StreamingResponse,
+    summary="Process PDF and stream insights",
+    description="Upload a PDF file or provide a PDF URL; insights are streamed back as Server-Sent Events while they are generated",
+    tags=["PDF Processing"]
+)
+async def process_pdf_stream_endpoint(
+    pdf_file: Optional[UploadFile] = File(
+        None,
+        description="PDF file to process",
+        media_type="application/pdf"
+    ),
+    pdf_url: Optional[str] = Form(
+        None,
+        description="Public URL to a PDF document"
+    ),
+    config: Config = Depends(get_config),
+    ocr_service: OCRService = Depends(get_ocr_service),
+    insights_service: InsightsService = Depends(get_insights_service),
+    file_service: FileService = Depends(get_file_service)
+):
+    """Process PDF input (uploaded file or URL) and stream insights as they are generated."""
+    source_filename, pdf_bytes = await resolve_pdf_input(pdf_file, pdf_url, config)
+    logger.info(f"Streaming insights for PDF: {source_filename}, size: {format_file_size(len(pdf_bytes))}")
+
+    try:
+        extracted_content = await ocr_service.process_pdf(source_filename, pdf_bytes)
+        await save_extracted_content_if_enabled(file_service, config, extracted_content, source_filename)
+
+    except OCRProcessingError:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error processing PDF for streaming: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while processing the PDF"
+        )
+
+    return StreamingResponse(
+        insights_event_stream(insights_service.stream_insights(extracted_content), source_filename),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post(
     "/api/process-pdf-url/",
     response_model=PDFProcessResponse,
@@ -545,16 +696,12 @@ async def process_pdf_url_endpoint(
     try:
         extracted_content = await ocr_service.process_pdf(source_filename, pdf_bytes)
 
-        if config.save_extracted_content:
-            file_service.save_extracted_content(extracted_content, source_filename)
-
-        insights = await insights_service.generate_insights(extracted_content)
-
-        return PDFProcessResponse(
-            insights=insights,
-            filename=source_filename
+        insights = await save_and_generate_insights(
+            file_service, insights_service, config, extracted_content, source_filename
         )
 
+        return build_process_response(insights, source_filename)
+
     except (OCRProcessingError, AIInsightsError):
         raise
     except Exception as e:
@@ -595,13 +742,9 @@ async def extract_text_endpoint(
         extracted_content = await ocr_service.process_pdf(source_filename, pdf_bytes)
         
         # Save extracted content if enabled
-        if config.save_extracted_content:
-            file_service.save_extracted_content(extracted_content, source_filename)
+        await save_extracted_content_if_enabled(file_service, config, extracted_content, source_filename)
         
-        return OCRResponse(
-            extracted_content=extracted_content,
-            filename=source_filename
-        )
+        return build_ocr_response(extracted_content, source_filename)
         
     except OCRProcessingError:
         raise
@@ -633,13 +776,9 @@ async def extract_text_url_endpoint(
     try:
         extracted_content = await ocr_service.process_pdf(source_filename, pdf_bytes)
 
-        if config.save_extracted_content:
-            file_service.save_extracted_content(extracted_content, source_filename)
+        await save_extracted_content_if_enabled(file_service, config, extracted_content, source_filename)
 
-        return OCRResponse(
-            extracted_content=extracted_content,
-            filename=source_filename
-        )
+        return build_ocr_response(extracted_content, source_filename)
 
     except OCRProcessingError:
         raise
@@ -6,6 +6,7 @@ class PDFProcessResponse(BaseModel):
     """Response model for PDF processing endpoint."""
     
     model_config = ConfigDict(
+        defer_build=True,
         json_schema_extra={
             "example": {
                 "insights": "This research paper presents a novel approach to...",
@@ -47,6 +48,7 @@ class OCRResponse(BaseModel):
     """Response model for OCR-only processing endpoint."""
     
     model_config = ConfigDict(
+        defer_build=True,
         json_schema_extra={
             "example": {
                 "extracted_content": "# Research Paper Title\n\nThis is the extracted text from the PDF...",
@@ -70,6 +72,7 @@ class ErrorResponse(BaseModel):
     """Error response model."""
     
     model_config = ConfigDict(
+        defer_build=True,
         json_schema_extra={
             "example": {
                 "detail": "Invalid file type. Please upload a PDF.",
@@ -93,6 +96,7 @@ class HealthResponse(BaseModel):
     """Health check response model."""
     
     model_config = ConfigDict(
+        defer_build=True,
         json_schema_extra={
             "example": {
                 "status": "healthy",
@@ -1,54 +1,84 @@
+from __future__ import annotations
+
 import asyncio
+import base64
+import hashlib
 import logging
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
 
-from mistralai import Mistral, DocumentURLChunk
-from mistralai.models.ocrresponse import OCRResponse
-from openai import AsyncOpenAI
+import httpx
 from starlette.concurrency import run_in_threadpool
 
 from config import Config
 from exceptions import OCRProcessingError, AIInsightsError
 from utils import replace_images_in_markdown, safe_filename, ensure_directory_exists, fix_markdown_urls
 
+if TYPE_CHECKING:
+    # The SDKs pull in large model trees; import them lazily at runtime.
+    from mistralai import Mistral
+    from mistralai.models.ocrresponse import OCRResponse
+    from openai import AsyncOpenAI
+
 logger = logging.getLogger(__name__)
 
+# Extracted content shorter than this is treated as empty; no LLM call is made
+MIN_INSIGHTS_CONTENT_LENGTH = 32
+EMPTY_DOCUMENT_INSIGHTS = "Could not generate insights: the document appears to be empty or unreadable."
+INSIGHTS_CACHE_SIZE = 128
+
+# Inline images are not requested from the OCR, so pages normally carry no base64 data
+OCR_INCLUDE_IMAGE_BASE64 = False
+
 
 class APIClientService:
     """Service for managing API clients."""
     
     def __init__(self, config: Config):
+        # SDK imports are deferred to here so importing this module stays cheap
+        from mistralai import Mistral
+        from openai import AsyncOpenAI, DEFAULT_CONNECTION_LIMITS, DEFAULT_TIMEOUT
+        
         self.config = config
-        self._mistral_client: Optional[Mistral] = None
-        self._openai_client: Optional[AsyncOpenAI] = None
-    
-    @property
-    def mistral_client(self) -> Mistral:
-        """Get or create Mistral client."""
-        if self._mistral_client is None:
-            self._mistral_client = Mistral(
-                api_key=self.config.mistral_api_key,
-                timeout_ms=self.config.ocr_timeout_ms,
-            )
-            logger.info(f"Mistral client initialized (timeout: {self.config.ocr_timeout_ms}ms)")
-        return self._mistral_client
-    
-    @property
-    def openai_client(self) -> AsyncOpenAI:
-        """Get or create AsyncOpenAI client."""
-        if self._openai_client is None:
-            client_kwargs = {"api_key": self.config.openai_api_key}
+        
+        # One connection pool for both SDKs. It is sized like the OpenAI SDK's own
+        # pool, because LLM completions and SSE streams hold a connection for their
+        # whole duration. Both SDKs' default clients follow redirects, so this one
+        # must too. The client keeps the httpx default timeout: Mistral passes
+        # timeout_ms on every request, and AsyncOpenAI gets its timeout below.
+        self.http_client = httpx.AsyncClient(
+            limits=DEFAULT_CONNECTION_LIMITS,
+            follow_redirects=True
+        )
+        
+        self.mistral_client: Mistral = Mistral(
+            api_key=config.mistral_api_key,
+            async_client=self.http_client,
+            timeout_ms=config.ocr_timeout_ms,
+        )
+        logger.info(f"Mistral client initialized (timeout: {config.ocr_timeout_ms}ms)")
+        
+        client_kwargs = {
+            "api_key": config.openai_api_key,
+            "http_client": self.http_client,
+            # Explicit, so the LLM timeout never follows the shared client's settings
+            "timeout": DEFAULT_TIMEOUT,
+        }
+        
+        if config.openai_api_host:
+            logger.info(f"Using custom OpenAI API host: {config.openai_api_host}")
+            client_kwargs["base_url"] = config.openai_api_host
+        else:
+            logger.info("Using default OpenAI API host")
             
-            if self.config.openai_api_host:
-                logger.info(f"Using custom OpenAI API host: {self.config.openai_api_host}")
-                client_kwargs["base_url"] = self.config.openai_api_host
-            else:
-                logger.info("Using default OpenAI API host")
-                
-            self._openai_client = AsyncOpenAI(**client_kwargs)
-            logger.info("AsyncOpenAI client initialized")
-        return self._openai_client
+        self.openai_client: AsyncOpenAI = AsyncOpenAI(**client_kwargs)
+        logger.info("AsyncOpenAI client initialized")
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP connection pool."""
+        await self.http_client.aclose()
+        logger.info("Shared HTTP client closed")
 
 
 class OCRService:
@@ -67,14 +97,18 @@ class OCRService:
         markdowns = []
         
         for page in ocr_response.pages:
-            image_data = {}
-            if page.images:
-                for img in page.images:
-                    if img.id and img.image_base64:
-                        image_data[img.id] = img.image_base64
+            image_data = None
+            if OCR_INCLUDE_IMAGE_BASE64 and page.images:
+                image_data = {
+                    img.id: img.image_base64
+                    for img in page.images
+                    if img.id and img.image_base64
+                }
             
-            page_markdown = replace_images_in_markdown(page.markdown, image_data)
-            markdowns.append(page_markdown)
+            if image_data:
+                markdowns.append(replace_images_in_markdown(page.markdown, image_data))
+            else:
+                markdowns.append(page.markdown or "")
         
         return "\n\n".join(markdowns)
     
@@ -83,58 +117,33 @@ class OCRService:
         if not pdf_bytes:
             raise OCRProcessingError("Empty PDF bytes provided")
             
+        from mistralai import DocumentURLChunk
+
         logger.info("Starting OCR processing with Mistral AI")
-        uploaded_file = None
+        document_name = pdf_filename or "document.pdf"
         
         async with self._ocr_semaphore:
             try:
-                # The Mistral SDK methods are synchronous; run them in a threadpool to avoid blocking.
-                uploaded_file = await run_in_threadpool(
-                    self.mistral_client.files.upload,
-                    file={
-                        "file_name": pdf_filename or "document.pdf",
-                        "content": pdf_bytes,
-                    },
-                    purpose="ocr"
-                )
-                
-                if not hasattr(uploaded_file, 'id'):
-                    raise OCRProcessingError(
-                        f"Invalid response from Mistral API: {uploaded_file}"
-                    )
+                # Send the PDF inline as a data URL instead of uploading, signing and
+                # deleting a temporary Mistral file (three extra round-trips).
+                document_base64 = await run_in_threadpool(base64.b64encode, pdf_bytes)
                 
-                signed_url = await run_in_threadpool(
-                    self.mistral_client.files.get_signed_url,
-                    file_id=uploaded_file.id,
-                    expiry=1
-                )
-                logger.info(f"File uploaded with ID: {uploaded_file.id}")
-                
-                ocr_response = await run_in_threadpool(
-                    self.mistral_client.ocr.process,
-                    document=DocumentURLChunk(document_url=signed_url.url),
+                # Async variant so the call goes through the shared httpx.AsyncClient
+                ocr_response = await self.mistral_client.ocr.process_async(
+                    document=DocumentURLChunk(
+                        document_url=f"data:application/pdf;base64,{document_base64.decode('ascii')}",
+                        document_name=document_name
+                    ),
                     model="mistral-ocr-latest",
-                    include_image_base64=False
+                    include_image_base64=OCR_INCLUDE_IMAGE_BASE64
                 )
                 
-                logger.info(f"OCR processing completed for file ID: {uploaded_file.id}")
+                logger.info(f"OCR processing completed for {document_name}")
                 return self.get_combined_markdown(ocr_response)
                 
             except Exception as e:
                 logger.error(f"OCR processing failed: {e}")
                 raise OCRProcessingError(f"Failed to process PDF with OCR: {str(e)}")
-            
-            finally:
-                # Clean up uploaded file
-                if uploaded_file and hasattr(uploaded_file, 'id'):
-                    try:
-                        await run_in_threadpool(
-                            self.mistral_client.files.delete,
-                            file_id=uploaded_file.id
-                        )
-                        logger.info(f"Cleaned up Mistral file ID: {uploaded_file.id}")
-                    except Exception as e:
-                        logger.error(f"Failed to delete Mistral file {uploaded_file.id}: {e}")
 
 
 class InsightsService:
@@ -143,27 +152,62 @@ class InsightsService:
     def __init__(self, openai_client: AsyncOpenAI, config: Config):
         self.openai_client = openai_client
         self.config = config
+        # Insights by content digest, so retries of the same PDF skip the LLM call
+        self._insights_cache: OrderedDict[str, str] = OrderedDict()
+    
+    @staticmethod
+    def _is_trivial_content(extracted_content: str) -> bool:
+        if not extracted_content or len(extracted_content.strip()) < MIN_INSIGHTS_CONTENT_LENGTH:
+            logger.warning("Empty or near-empty content provided for insights generation")
+            return True
+        return False
+    
+    @staticmethod
+    def _content_key(extracted_content: str) -> str:
+        return hashlib.sha256(extracted_content.encode("utf-8")).hexdigest()
+    
+    def _get_cached_insights(self, key: str) -> Optional[str]:
+        insights = self._insights_cache.get(key)
+        if insights is not None:
+            self._insights_cache.move_to_end(key)
+            logger.info("Returning cached insights for previously seen content")
+        return insights
+    
+    def _cache_insights(self, key: str, insights: str) -> None:
+        self._insights_cache[key] = insights
+        self._insights_cache.move_to_end(key)
+        if len(self._insights_cache) > INSIGHTS_CACHE_SIZE:
+            self._insights_cache.popitem(last=False)
+    
+    def _build_messages(self, extracted_content: str) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": self.config.system_prompt
+            },
+            {
+                "role": "user", 
+                "content": extracted_content
+            }
+        ]
     
     async def generate_insights(self, extracted_content: str) -> str:
         """Generate AI insights from extracted markdown content."""
-        if not extracted_content or not extracted_content.strip():
-            logger.warning("Empty content provided for insights generation")
-            extracted_content = "The document appears to be empty or no text could be extracted."
+        if self._is_trivial_content(extracted_content):
+            return EMPTY_DOCUMENT_INSIGHTS
+        
+        cache_key = self._content_key(extracted_content)
+        cached_insights = self._get_cached_insights(cache_key)
+        if cached_insights is not None:
+            return cached_insights
+        
+        messages = self._build_messages(extracted_content)
         
         logger.info(f"Generating insights using model: {self.config.model}")
         
         try:
             response = await self.openai_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.config.system_prompt
-                    },
-                    {
-                        "role": "user", 
-                        "content": extracted_content
-                    }
-                ],
+                messages=messages,
                 model=self.config.model,
                 temperature=0.7
             )
@@ -174,6 +218,7 @@ class InsightsService:
                 return "Could not generate insights for the provided document."
             
             insights = fix_markdown_urls(insights)
+            self._cache_insights(cache_key, insights)
             
             logger.info("Successfully generated AI insights")
             return insights
@@ -181,6 +226,75 @@ class InsightsService:
         except Exception as e:
             logger.error(f"Failed to generate insights: {e}")
             raise AIInsightsError(f"Failed to generate insights: {str(e)}")
+    
+    async def stream_insights(self, extracted_content: str) -> AsyncIterator[str]:
+        """Stream AI insights, yielding markdown one completed block at a time.
+        
+        Text is held back until a blank line closes the current block so that
+        fix_markdown_urls never sees a half-received link. A stream that runs
+        to completion is cached like a generate_insights result.
+        """
+        if self._is_trivial_content(extracted_content):
+            yield EMPTY_DOCUMENT_INSIGHTS
+            return
+        
+        cache_key = self._content_key(extracted_content)
+        cached_insights = self._get_cached_insights(cache_key)
+        if cached_insights is not None:
+            yield cached_insights
+            return
+        
+        messages = self._build_messages(extracted_content)
+        
+        logger.info(f"Streaming insights using model: {self.config.model}")
+        
+        try:
+            stream = await self.openai_client.chat.completions.create(
+                messages=messages,
+                model=self.config.model,
+                temperature=0.7,
+                stream=True
+            )
+            
+            pending = ""
+            blocks = []
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    
+                    pending += delta
+                    block_end = pending.rfind("\n\n")
+                    if block_end != -1:
+                        block = fix_markdown_urls(pending[:block_end + 2])
+                        blocks.append(block)
+                        # Whitespace-only blocks would go out as empty SSE data events
+                        if block.strip():
+                            yield block
+                        pending = pending[block_end + 2:]
+            finally:
+                # Release the upstream response (and its pooled connection) on
+                # completion, error, or when the client disconnects mid-stream
+                await stream.close()
+            
+            if pending:
+                block = fix_markdown_urls(pending)
+                blocks.append(block)
+                if block.strip():
+                    yield block
+            
+            # Only reached when the stream finished; aborted streams are not cached
+            if blocks:
+                self._cache_insights(cache_key, "".join(blocks))
+            
+            logger.info("Successfully streamed AI insights")
+            
+        except Exception as e:
+            logger.error(f"Failed to stream insights: {e}")
+            raise AIInsightsError(f"Failed to generate insights: {str(e)}")
 
 
 class FileService:
@@ -216,3 +330,7 @@ class FileService:
         except Exception as e:
             logger.error(f"Failed to save extracted content: {e}")
             raise OSError(f"Failed to save extracted content: {e}")
+    
+    async def save_extracted_content_async(self, content: str, original_filename: Optional[str]) -> Path:
+        """Save extracted content to file without blocking the event loop."""
+        return await run_in_threadpool(self.save_extracted_content, content, original_filename)
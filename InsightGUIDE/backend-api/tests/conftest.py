@@ -1,8 +1,16 @@
 """Test configuration and fixtures."""
 
+import os
+from pathlib import Path
+
 import pytest
 from unittest.mock import Mock, AsyncMock
-from fastapi.testclient import TestClient
+
+# main loads its configuration at import time and refuses to start without it
+os.environ.setdefault("MISTRAL_API_KEY", "test_mistral_key")
+os.environ.setdefault("OPENAI_API_KEY", "test_openai_key")
+os.environ.setdefault("MODEL", "gpt-3.5-turbo")
+os.environ.setdefault("SYSTEM_PROMPT_FILE", str(Path(__file__).resolve().parent.parent / "system_prompts.yaml"))
 
 from config import Config
 from services import APIClientService
@@ -29,9 +37,6 @@ def mock_config():
 def mock_mistral_client():
     """Mock Mistral client for testing."""
     client = Mock()
-    client.files.upload.return_value = Mock(id="test_file_id")
-    client.files.get_signed_url.return_value = Mock(url="https://test.url")
-    client.files.delete.return_value = None
     
     # Mock OCR response
     mock_page = Mock()
@@ -41,7 +46,7 @@ def mock_mistral_client():
     mock_ocr_response = Mock()
     mock_ocr_response.pages = [mock_page]
     
-    client.ocr.process.return_value = mock_ocr_response
+    client.ocr.process_async = AsyncMock(return_value=mock_ocr_response)
     return client
 
 
@@ -63,14 +68,17 @@ def mock_openai_client():
 def api_client_service(mock_config):
     """Mock API client service."""
     service = APIClientService(mock_config)
-    service._mistral_client = Mock()
-    service._openai_client = AsyncMock()
+    service.mistral_client = Mock()
+    service.openai_client = AsyncMock()
     return service
 
 
-@pytest.fixture
-def test_client():
-    """Test client for API testing."""
+@pytest.fixture(scope="session")
+def client():
+    """Test client shared across the session; endpoint tests override app state per test."""
+    # Imported here so test runs that never request the client skip the testclient import
+    from fastapi.testclient import TestClient
+
     return TestClient(app)
 
 
@@ -3,8 +3,9 @@
 import os
 import pytest
 import tempfile
-from unittest.mock import patch, mock_open
+from unittest.mock import patch
 
+import config
 from config import load_config, load_system_prompt, Config
 from exceptions import ConfigurationError
 
@@ -27,7 +28,7 @@ class TestConfig:
     def test_config_validation_missing_required(self):
         """Test config validation with missing required fields."""
         with pytest.raises(ValueError):
-            Config(mistral_api_key="", openai_api_key="test", model="test")
+            Config(mistral_api_key="", openai_api_key="test", model="test", system_prompt="test")
     
     def test_log_level_validation(self):
         """Test log level validation."""
@@ -41,33 +42,125 @@ class TestConfig:
         with pytest.raises(ValueError):
             Config(**config_data)
 
+    def test_load_config_reads_environment_once(self, monkeypatch):
+        """load_config should read settings from the environment and cache the result."""
+        monkeypatch.setenv("MISTRAL_API_KEY", "env_mistral")
+        monkeypatch.setenv("OPENAI_API_KEY", "env_openai")
+        monkeypatch.setenv("MODEL", "env-model")
+        monkeypatch.setenv("MAX_FILE_SIZE", "2048  # bytes")
+        monkeypatch.setenv("LOG_LEVEL", "debug")
+
+        load_config.cache_clear()
+        try:
+            with patch("config.load_dotenv"):
+                config = load_config()
+                assert load_config() is config
+        finally:
+            load_config.cache_clear()
+
+        assert config.mistral_api_key == "env_mistral"
+        assert config.model == "env-model"
+        assert config.max_file_size == 2048
+        assert config.max_file_size_str == "2.0 KB"
+        assert config.log_level == "DEBUG"
+
+    def test_frontend_url_accepts_comma_separated_origins(self):
+        """Several CORS origins can be configured in one frontend_url value."""
+        config = Config(
+            mistral_api_key="test",
+            openai_api_key="test",
+            model="test",
+            system_prompt="test",
+            frontend_url="https://app.example.com, http://localhost:9002"
+        )
+        assert config.frontend_urls == ("https://app.example.com", "http://localhost:9002")
+
+        with pytest.raises(ValueError):
+            Config(
+                mistral_api_key="test",
+                openai_api_key="test",
+                model="test",
+                system_prompt="test",
+                frontend_url="https://app.example.com,app.example.org"
+            )
+
+
+@pytest.fixture(scope="module")
+def prompt_yaml(tmp_path_factory):
+    """Prompts file written once per module and shared by the loading tests."""
+    path = tmp_path_factory.mktemp("prompts") / "prompts.yaml"
+    path.write_text(
+        """
+prompts:
+  test-prompt:
+    content: "This is a test prompt"
+  other-prompt:
+    content: "Other prompt"
+  broken-prompt: "Not a mapping"
+  list-prompt:
+    - "Not a mapping either"
+""",
+        encoding="utf-8"
+    )
+    return path
+
 
 class TestSystemPromptLoading:
     """Test system prompt loading functionality."""
     
-    def test_load_system_prompt_success(self):
+    def test_load_system_prompt_success(self, prompt_yaml):
         """Test successful system prompt loading."""
-        yaml_content = """
-prompts:
-  test-prompt:
-    content: "This is a test prompt"
-"""
-        with patch("builtins.open", mock_open(read_data=yaml_content)):
-            result = load_system_prompt("test.yaml", "test-prompt")
-            assert result == "This is a test prompt"
+        result = load_system_prompt(str(prompt_yaml), "test-prompt")
+        assert result == "This is a test prompt"
     
-    def test_load_system_prompt_missing_key(self):
+    def test_load_system_prompt_missing_key(self, prompt_yaml):
         """Test system prompt loading with missing key."""
-        yaml_content = """
-prompts:
-  other-prompt:
-    content: "Other prompt"
-"""
-        with patch("builtins.open", mock_open(read_data=yaml_content)):
-            with pytest.raises(ValueError, match="Prompt key 'missing-key' not found"):
-                load_system_prompt("test.yaml", "missing-key")
+        with pytest.raises(ValueError, match="Prompt key 'missing-key' not found"):
+            load_system_prompt(str(prompt_yaml), "missing-key")
+    
+    def test_load_system_prompt_malformed_entry(self, prompt_yaml):
+        """A malformed entry is reported as ValueError and doesn't affect its siblings."""
+        assert load_system_prompt(str(prompt_yaml), "other-prompt") == "Other prompt"
+
+        with pytest.raises(ValueError, match="Invalid prompt entry 'broken-prompt'"):
+            load_system_prompt(str(prompt_yaml), "broken-prompt")
+        with pytest.raises(ValueError, match="Invalid prompt entry 'list-prompt'"):
+            load_system_prompt(str(prompt_yaml), "list-prompt")
     
     def test_load_system_prompt_file_not_found(self):
         """Test system prompt loading with missing file."""
         with pytest.raises(ValueError, match="System prompt file missing.yaml not found"):
             load_system_prompt("missing.yaml", "test-prompt")
+
+    def test_load_system_prompt_cached_until_file_changes(self, tmp_path):
+        """Repeated loads should reuse the parse until the file's mtime changes."""
+        prompt_file = tmp_path / "prompts.yaml"
+        prompt_file.write_text('prompts:\n  test-prompt:\n    content: "First"\n')
+
+        with patch.object(config, "read_prompt_contents", wraps=config.read_prompt_contents) as reader:
+            assert load_system_prompt(str(prompt_file), "test-prompt") == "First"
+            assert load_system_prompt(str(prompt_file), "test-prompt") == "First"
+            assert reader.call_count == 1
+
+            prompt_file.write_text('prompts:\n  test-prompt:\n    content: "Second"\n')
+            stat = prompt_file.stat()
+            os.utime(prompt_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+            assert load_system_prompt(str(prompt_file), "test-prompt") == "Second"
+            assert reader.call_count == 2
+
+    def test_yaml_loader_prefers_libyaml(self, monkeypatch):
+        """The C loader is used when available, with the pure-Python loader as fallback."""
+        import yaml
+
+        config._yaml_safe_loader.cache_clear()
+        try:
+            if hasattr(yaml, "CSafeLoader"):
+                assert config._yaml_safe_loader() is yaml.CSafeLoader
+                config._yaml_safe_loader.cache_clear()
+
+            monkeypatch.delattr(yaml, "CSafeLoader", raising=False)
+            assert config._yaml_safe_loader() is yaml.SafeLoader
+        finally:
+            monkeypatch.undo()
+            config._yaml_safe_loader.cache_clear()
@@ -1,18 +1,69 @@
 """Tests for the main API endpoints."""
 
+import asyncio
+import copy
+
 import pytest
+from fastapi import HTTPException
 from unittest.mock import patch, Mock, AsyncMock
-from fastapi.testclient import TestClient
 
-from main import app, get_app_state
+from exceptions import OCRProcessingError
+from main import (
+    app,
+    get_app_state,
+    insights_event_stream,
+    read_and_validate_pdf,
+    save_and_generate_insights,
+)
+
+_DEFAULT_MAX_FILE_SIZE = 10 * 1024 * 1024
+_DEFAULT_MAX_FILE_SIZE_STR = "10.0 MB"
+
+
+@pytest.fixture(scope="module")
+def _mock_app_state_prototype():
+    """Mock application state built once per module; tests work on deep copies."""
+    mock_app_state = Mock()
+    mock_app_state.config = Mock(
+        max_file_size=_DEFAULT_MAX_FILE_SIZE,
+        max_file_size_str=_DEFAULT_MAX_FILE_SIZE_STR,
+        save_extracted_content=False
+    )
+    mock_app_state.ocr_service = Mock()
+    mock_app_state.insights_service = Mock()
+    mock_app_state.file_service = Mock()
+    mock_app_state.initialized = True
+
+    mock_app_state.ocr_service.process_pdf = AsyncMock(return_value="Extracted content")
+    mock_app_state.insights_service.generate_insights = AsyncMock(return_value="Generated insights")
+    mock_app_state.file_service.save_extracted_content_async = AsyncMock(return_value=None)
+    return mock_app_state
+
+
+def _override_app_state(prototype, extracted_content, with_insights=True):
+    """Install a fresh copy of the prototype state as the app state for one test.
+
+    OCR-only endpoint tests pass ``with_insights=False`` so any use of the
+    insights service fails instead of hitting the prototype's mock.
+    """
+    # deepcopy, not copy: a shallow copy would share child mocks between tests
+    mock_app_state = copy.deepcopy(prototype)
+    mock_app_state.ocr_service.process_pdf.return_value = extracted_content
+    if not with_insights:
+        del mock_app_state.insights_service
+
+    app.dependency_overrides[get_app_state] = lambda: mock_app_state
+    try:
+        yield mock_app_state
+    finally:
+        app.dependency_overrides.clear()
 
 
 class TestHealthEndpoint:
     """Test the health check endpoint."""
     
-    def test_health_check(self):
+    def test_health_check(self, client):
         """Test health check returns expected response."""
-        client = TestClient(app)
         response = client.get("/health")
         
         assert response.status_code == 200
@@ -25,29 +76,12 @@ class TestPDFProcessingEndpoint:
     """Test the PDF processing endpoint."""
     
     @pytest.fixture
-    def mock_services(self):
+    def mock_services(self, _mock_app_state_prototype):
         """Mock all services for testing."""
-        mock_app_state = Mock()
-        mock_app_state.config = Mock(max_file_size=10*1024*1024, save_extracted_content=False)
-        mock_app_state.ocr_service = Mock()
-        mock_app_state.insights_service = Mock()
-        mock_app_state.file_service = Mock()
-        mock_app_state.initialized = True
-
-        mock_app_state.ocr_service.process_pdf = AsyncMock(return_value="Extracted content")
-        mock_app_state.insights_service.generate_insights = AsyncMock(return_value="Generated insights")
-        mock_app_state.file_service.save_extracted_content.return_value = None
-
-        app.dependency_overrides[get_app_state] = lambda: mock_app_state
-        try:
-            yield mock_app_state
-        finally:
-            app.dependency_overrides.clear()
+        yield from _override_app_state(_mock_app_state_prototype, "Extracted content")
     
-    def test_process_pdf_invalid_content_type(self, mock_services):
+    def test_process_pdf_invalid_content_type(self, client, mock_services):
         """Test PDF processing with invalid content type."""
-        client = TestClient(app)
-        
         file_content = b"Not a PDF file"
         response = client.post(
             "/api/process-pdf/",
@@ -57,10 +91,8 @@ class TestPDFProcessingEndpoint:
         assert response.status_code == 400
         assert "Invalid file type" in response.json()["detail"]
     
-    def test_process_pdf_invalid_filename(self, mock_services):
+    def test_process_pdf_invalid_filename(self, client, mock_services):
         """Test PDF processing with invalid filename."""
-        client = TestClient(app)
-        
         file_content = b"%PDF-1.4 content"
         response = client.post(
             "/api/process-pdf/",
@@ -70,10 +102,8 @@ class TestPDFProcessingEndpoint:
         assert response.status_code == 400
         assert "Invalid filename" in response.json()["detail"]
     
-    def test_process_pdf_invalid_pdf_content(self, mock_services):
+    def test_process_pdf_invalid_pdf_content(self, client, mock_services):
         """Test PDF processing with invalid PDF content."""
-        client = TestClient(app)
-        
         file_content = b"Not PDF content"
         response = client.post(
             "/api/process-pdf/",
@@ -83,10 +113,8 @@ class TestPDFProcessingEndpoint:
         assert response.status_code == 400
         assert "does not appear to be a valid PDF" in response.json()["detail"]
     
-    def test_process_pdf_success(self, mock_services):
+    def test_process_pdf_success(self, client, mock_services):
         """Test successful PDF processing."""
-        client = TestClient(app)
-        
         file_content = b"%PDF-1.4\nPDF content here"
 
         response = client.post(
@@ -99,10 +127,69 @@ class TestPDFProcessingEndpoint:
         assert "insights" in data
         assert data["filename"] == "test.pdf"
 
-    def test_process_pdf_success_with_url(self, mock_services):
-        """Test successful PDF processing using URL input."""
-        client = TestClient(app)
+    def test_process_pdf_saves_extracted_content_when_enabled(self, client, mock_services):
+        """Extracted content should be saved alongside insights generation."""
+        mock_services.config.save_extracted_content = True
+        file_content = b"%PDF-1.4\nPDF content here"
+        response = client.post(
+            "/api/process-pdf/",
+            files={"pdf_file": ("test.pdf", file_content, "application/pdf")}
+        )
+
+        assert response.status_code == 200
+        mock_services.file_service.save_extracted_content_async.assert_awaited_once_with("Extracted content", "test.pdf")
+        mock_services.insights_service.generate_insights.assert_awaited_once_with("Extracted content")
+
+    def test_process_pdf_ocr_error_returns_error_response(self, client, mock_services):
+        """Application errors should be serialized as ErrorResponse JSON."""
+        mock_services.ocr_service.process_pdf = AsyncMock(side_effect=OCRProcessingError("OCR failed"))
+        file_content = b"%PDF-1.4\nPDF content here"
+        response = client.post(
+            "/api/process-pdf/",
+            files={"pdf_file": ("test.pdf", file_content, "application/pdf")}
+        )
+
+        assert response.status_code == 400
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == {"detail": "OCR failed", "error_type": "OCRProcessingError"}
+
+    def test_process_pdf_empty_insights_returns_error(self, client, mock_services):
+        """Empty insights must not be returned as a successful, empty response."""
+        mock_services.insights_service.generate_insights = AsyncMock(return_value="")
+        response = client.post(
+            "/api/process-pdf/",
+            files={"pdf_file": ("test.pdf", b"%PDF-1.4\nPDF content here", "application/pdf")}
+        )
+
+        assert response.status_code == 400
+        assert response.json() == {
+            "detail": "AI model returned empty insights",
+            "error_type": "AIInsightsError"
+        }
+
+    def test_process_pdf_stream_success(self, client, mock_services):
+        """Streaming endpoint should relay insight chunks as Server-Sent Events."""
+        async def fake_stream(content):
+            yield "### Summary\n\n"
+            yield "Point one"
+
+        mock_services.insights_service.stream_insights = fake_stream
+        file_content = b"%PDF-1.4\nPDF content here"
+        response = client.post(
+            "/api/process-pdf/stream",
+            files={"pdf_file": ("test.pdf", file_content, "application/pdf")}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == (
+            "data: ### Summary\ndata: \ndata: \n\n"
+            "data: Point one\n\n"
+            "event: done\ndata: test.pdf\n\n"
+        )
 
+    def test_process_pdf_success_with_url(self, client, mock_services):
+        """Test successful PDF processing using URL input."""
         with patch('main.download_pdf_from_url', new=AsyncMock(return_value=("arxiv-paper.pdf", b"%PDF-1.4\nurl content"))):
             response = client.post(
                 "/api/process-pdf/",
@@ -114,19 +201,15 @@ class TestPDFProcessingEndpoint:
             assert data["filename"] == "arxiv-paper.pdf"
             assert "insights" in data
 
-    def test_process_pdf_missing_input(self, mock_services):
+    def test_process_pdf_missing_input(self, client, mock_services):
         """Test PDF processing with missing input source."""
-        client = TestClient(app)
-
         response = client.post("/api/process-pdf/")
 
         assert response.status_code == 400
         assert "either a PDF file or a PDF URL" in response.json()["detail"]
 
-    def test_process_pdf_both_inputs(self, mock_services):
+    def test_process_pdf_both_inputs(self, client, mock_services):
         """Test PDF processing with both file and URL provided."""
-        client = TestClient(app)
-
         file_content = b"%PDF-1.4\nPDF content here"
         response = client.post(
             "/api/process-pdf/",
@@ -142,27 +225,12 @@ class TestTextExtractionEndpoint:
     """Test the text extraction (OCR-only) endpoint."""
     
     @pytest.fixture
-    def mock_services(self):
+    def mock_services(self, _mock_app_state_prototype):
         """Mock all services for testing."""
-        mock_app_state = Mock()
-        mock_app_state.config = Mock(max_file_size=10*1024*1024, save_extracted_content=False)
-        mock_app_state.ocr_service = Mock()
-        mock_app_state.file_service = Mock()
-        mock_app_state.initialized = True
-
-        mock_app_state.ocr_service.process_pdf = AsyncMock(return_value="Extracted markdown content")
-        mock_app_state.file_service.save_extracted_content.return_value = None
-
-        app.dependency_overrides[get_app_state] = lambda: mock_app_state
-        try:
-            yield mock_app_state
-        finally:
-            app.dependency_overrides.clear()
+        yield from _override_app_state(_mock_app_state_prototype, "Extracted markdown content", with_insights=False)
     
-    def test_extract_text_invalid_content_type(self, mock_services):
+    def test_extract_text_invalid_content_type(self, client, mock_services):
         """Test text extraction with invalid content type."""
-        client = TestClient(app)
-        
         file_content = b"Not a PDF file"
         response = client.post(
             "/api/extract-text/",
@@ -172,10 +240,8 @@ class TestTextExtractionEndpoint:
         assert response.status_code == 400
         assert "Invalid file type" in response.json()["detail"]
     
-    def test_extract_text_invalid_filename(self, mock_services):
+    def test_extract_text_invalid_filename(self, client, mock_services):
         """Test text extraction with invalid filename."""
-        client = TestClient(app)
-        
         file_content = b"%PDF-1.4 content"
         response = client.post(
             "/api/extract-text/",
@@ -185,10 +251,8 @@ class TestTextExtractionEndpoint:
         assert response.status_code == 400
         assert "Invalid filename" in response.json()["detail"]
     
-    def test_extract_text_invalid_pdf_content(self, mock_services):
+    def test_extract_text_invalid_pdf_content(self, client, mock_services):
         """Test text extraction with invalid PDF content."""
-        client = TestClient(app)
-        
         file_content = b"Not PDF content"
         response = client.post(
             "/api/extract-text/",
@@ -198,10 +262,8 @@ class TestTextExtractionEndpoint:
         assert response.status_code == 400
         assert "does not appear to be a valid PDF" in response.json()["detail"]
     
-    def test_extract_text_success(self, mock_services):
+    def test_extract_text_success(self, client, mock_services):
         """Test successful text extraction."""
-        client = TestClient(app)
-        
         file_content = b"%PDF-1.4\nPDF content here"
 
         mock_services.ocr_service.process_pdf = AsyncMock(
@@ -222,10 +284,22 @@ class TestTextExtractionEndpoint:
         # Verify OCR service was called but insights service was not
         mock_services.ocr_service.process_pdf.assert_called_once()
 
-    def test_extract_text_success_with_url(self, mock_services):
-        """Test successful text extraction using URL input."""
-        client = TestClient(app)
+    def test_extract_text_empty_ocr_output_returns_error(self, client, mock_services):
+        """Empty OCR output must not be returned as a successful, empty response."""
+        mock_services.ocr_service.process_pdf = AsyncMock(return_value="")
+        response = client.post(
+            "/api/extract-text/",
+            files={"pdf_file": ("empty.pdf", b"%PDF-1.4\nPDF content here", "application/pdf")}
+        )
+
+        assert response.status_code == 400
+        assert response.json() == {
+            "detail": "No text could be extracted from the PDF",
+            "error_type": "OCRProcessingError"
+        }
 
+    def test_extract_text_success_with_url(self, client, mock_services):
+        """Test successful text extraction using URL input."""
         with patch('main.download_pdf_from_url', new=AsyncMock(return_value=("research-paper.pdf", b"%PDF-1.4\nurl content"))):
             response = client.post(
                 "/api/extract-text/",
@@ -237,12 +311,11 @@ class TestTextExtractionEndpoint:
             assert data["filename"] == "research-paper.pdf"
             assert "extracted_content" in data
     
-    def test_extract_text_file_too_large(self, mock_services):
+    def test_extract_text_file_too_large(self, client, mock_services):
         """Test text extraction with file too large."""
         # Set a very small max file size for testing
         mock_services.config.max_file_size = 10
-        
-        client = TestClient(app)
+        mock_services.config.max_file_size_str = "10.0 B"
         
         file_content = b"%PDF-1.4\nThis is a longer PDF content that exceeds the limit"
         response = client.post(
@@ -251,36 +324,19 @@ class TestTextExtractionEndpoint:
         )
         
         assert response.status_code == 413
-        assert "File too large" in response.json()["detail"]
+        assert response.json()["detail"] == "File too large. Maximum size: 10.0 B"
 
 
 class TestPDFURLProcessingEndpoint:
     """Test the URL-only PDF processing endpoint."""
 
     @pytest.fixture
-    def mock_services(self):
+    def mock_services(self, _mock_app_state_prototype):
         """Mock all services for testing."""
-        mock_app_state = Mock()
-        mock_app_state.config = Mock(max_file_size=10*1024*1024, save_extracted_content=False)
-        mock_app_state.ocr_service = Mock()
-        mock_app_state.insights_service = Mock()
-        mock_app_state.file_service = Mock()
-        mock_app_state.initialized = True
-
-        mock_app_state.ocr_service.process_pdf = AsyncMock(return_value="Extracted content")
-        mock_app_state.insights_service.generate_insights = AsyncMock(return_value="Generated insights")
-        mock_app_state.file_service.save_extracted_content.return_value = None
-
-        app.dependency_overrides[get_app_state] = lambda: mock_app_state
-        try:
-            yield mock_app_state
-        finally:
-            app.dependency_overrides.clear()
-
-    def test_process_pdf_url_success(self, mock_services):
-        """Test successful URL-based PDF processing via JSON endpoint."""
-        client = TestClient(app)
+        yield from _override_app_state(_mock_app_state_prototype, "Extracted content")
 
+    def test_process_pdf_url_success(self, client, mock_services):
+        """Test successful URL-based PDF processing via JSON endpoint."""
         with patch('main.download_pdf_from_url', new=AsyncMock(return_value=("arxiv-paper.pdf", b"%PDF-1.4\nurl content"))):
             response = client.post(
                 "/api/process-pdf-url/",
@@ -292,10 +348,8 @@ class TestPDFURLProcessingEndpoint:
             assert data["filename"] == "arxiv-paper.pdf"
             assert "insights" in data
 
-    def test_process_pdf_url_missing_payload_field(self, mock_services):
+    def test_process_pdf_url_missing_payload_field(self, client, mock_services):
         """Test URL endpoint with missing pdf_url field."""
-        client = TestClient(app)
-
         response = client.post(
             "/api/process-pdf-url/",
             json={}
@@ -303,10 +357,8 @@ class TestPDFURLProcessingEndpoint:
 
         assert response.status_code == 422
 
-    def test_process_pdf_url_invalid_scheme(self, mock_services):
+    def test_process_pdf_url_invalid_scheme(self, client, mock_services):
         """Test URL endpoint with unsupported URL scheme."""
-        client = TestClient(app)
-
         response = client.post(
             "/api/process-pdf-url/",
             json={"pdf_url": "ftp://example.com/paper.pdf"}
@@ -315,10 +367,8 @@ class TestPDFURLProcessingEndpoint:
         assert response.status_code == 400
         assert "valid HTTPS URL" in response.json()["detail"]
 
-    def test_process_pdf_url_rejects_restricted_address(self, mock_services):
+    def test_process_pdf_url_rejects_restricted_address(self, client, mock_services):
         """Test URL endpoint rejects private/restricted network targets."""
-        client = TestClient(app)
-
         response = client.post(
             "/api/process-pdf-url/",
             json={"pdf_url": "https://127.0.0.1/paper.pdf"}
@@ -332,27 +382,12 @@ class TestOCRURLProcessingEndpoint:
     """Test the URL-only OCR endpoint."""
 
     @pytest.fixture
-    def mock_services(self):
+    def mock_services(self, _mock_app_state_prototype):
         """Mock OCR services for testing."""
-        mock_app_state = Mock()
-        mock_app_state.config = Mock(max_file_size=10*1024*1024, save_extracted_content=False)
-        mock_app_state.ocr_service = Mock()
-        mock_app_state.file_service = Mock()
-        mock_app_state.initialized = True
-
-        mock_app_state.ocr_service.process_pdf = AsyncMock(return_value="# Extracted from URL")
-        mock_app_state.file_service.save_extracted_content.return_value = None
-
-        app.dependency_overrides[get_app_state] = lambda: mock_app_state
-        try:
-            yield mock_app_state
-        finally:
-            app.dependency_overrides.clear()
-
-    def test_extract_text_url_success(self, mock_services):
-        """Test successful OCR extraction from URL via JSON endpoint."""
-        client = TestClient(app)
+        yield from _override_app_state(_mock_app_state_prototype, "# Extracted from URL", with_insights=False)
 
+    def test_extract_text_url_success(self, client, mock_services):
+        """Test successful OCR extraction from URL via JSON endpoint."""
         with patch('main.download_pdf_from_url', new=AsyncMock(return_value=("paper.pdf", b"%PDF-1.4\nurl content"))):
             response = client.post(
                 "/api/extract-text-url/",
@@ -364,10 +399,8 @@ class TestOCRURLProcessingEndpoint:
             assert data["filename"] == "paper.pdf"
             assert data["extracted_content"] == "# Extracted from URL"
 
-    def test_extract_text_url_missing_payload_field(self, mock_services):
+    def test_extract_text_url_missing_payload_field(self, client, mock_services):
         """Test OCR URL endpoint with missing pdf_url field."""
-        client = TestClient(app)
-
         response = client.post(
             "/api/extract-text-url/",
             json={}
@@ -375,10 +408,8 @@ class TestOCRURLProcessingEndpoint:
 
         assert response.status_code == 422
 
-    def test_extract_text_url_invalid_scheme(self, mock_services):
+    def test_extract_text_url_invalid_scheme(self, client, mock_services):
         """Test OCR URL endpoint with unsupported URL scheme."""
-        client = TestClient(app)
-
         response = client.post(
             "/api/extract-text-url/",
             json={"pdf_url": "ftp://example.com/paper.pdf"}
@@ -387,10 +418,8 @@ class TestOCRURLProcessingEndpoint:
         assert response.status_code == 400
         assert "valid HTTPS URL" in response.json()["detail"]
 
-    def test_extract_text_url_rejects_restricted_address(self, mock_services):
+    def test_extract_text_url_rejects_restricted_address(self, client, mock_services):
         """Test OCR URL endpoint rejects private/restricted network targets."""
-        client = TestClient(app)
-
         response = client.post(
             "/api/extract-text-url/",
             json={"pdf_url": "https://127.0.0.1/paper.pdf"}
@@ -398,3 +427,108 @@ class TestOCRURLProcessingEndpoint:
 
         assert response.status_code == 400
         assert "restricted network address" in response.json()["detail"]
+
+
+class TestReadAndValidatePdf:
+    """Test chunked reading of uploaded PDFs."""
+
+    def test_stops_reading_once_limit_exceeded(self):
+        """Oversize uploads should be rejected without draining the whole stream."""
+        upload = Mock(size=None)
+        upload.read = AsyncMock(side_effect=[b"%PDF-1.4", b"x" * 8, b"x" * 8, b""])
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_and_validate_pdf(upload, 10, "10.0 B"))
+
+        assert exc_info.value.status_code == 413
+        assert upload.read.await_count == 2
+
+    def test_rejects_bad_signature_on_first_chunk(self):
+        """Non-PDF uploads should be rejected after the first chunk."""
+        upload = Mock(size=None)
+        upload.read = AsyncMock(side_effect=[b"Not a PDF", b"more", b""])
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_and_validate_pdf(upload, 1024, "1.0 KB"))
+
+        assert exc_info.value.status_code == 400
+        assert upload.read.await_count == 1
+
+    def test_returns_read_buffer_without_copying(self):
+        """The chunk buffer itself is returned, so the upload is held in memory once."""
+        upload = Mock(size=None)
+        upload.read = AsyncMock(side_effect=[b"%PDF-1.4\n", b"rest", b""])
+
+        result = asyncio.run(read_and_validate_pdf(upload, 1024, "1.0 KB"))
+
+        assert isinstance(result, bytearray)
+        assert result == b"%PDF-1.4\nrest"
+
+    def test_rejects_known_oversize_upload_without_reading(self):
+        """Uploads whose spooled size already exceeds the limit should not be read at all."""
+        upload = Mock(size=2048)
+        upload.read = AsyncMock(return_value=b"%PDF-1.4")
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_and_validate_pdf(upload, 1024, "1.0 KB"))
+
+        assert exc_info.value.status_code == 413
+        assert exc_info.value.detail == "File too large. Maximum size: 1.0 KB"
+        upload.read.assert_not_awaited()
+
+
+class TestSaveAndGenerateInsights:
+    """Test running the content save alongside insights generation."""
+
+    def test_failed_save_cancels_insights(self):
+        """If saving fails, the in-flight LLM call should be cancelled, not left running."""
+        insights_state = {"started": False, "cancelled": False}
+
+        async def slow_insights(extracted_content):
+            insights_state["started"] = True
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                insights_state["cancelled"] = True
+                raise
+            return "Generated insights"
+
+        async def failing_save(extracted_content, source_filename):
+            await asyncio.sleep(0)
+            raise OSError("disk full")
+
+        file_service = Mock(save_extracted_content_async=failing_save)
+        insights_service = Mock(generate_insights=slow_insights)
+        config = Mock(save_extracted_content=True)
+
+        async def run():
+            with pytest.raises(OSError, match="disk full"):
+                await save_and_generate_insights(
+                    file_service, insights_service, config, "Extracted content", "test.pdf"
+                )
+            # Let the cancelled task process its CancelledError; checked inside the
+            # loop because asyncio.run would cancel any leftover task on exit anyway
+            await asyncio.sleep(0)
+            assert insights_state == {"started": True, "cancelled": True}
+
+        asyncio.run(run())
+
+
+class TestInsightsEventStream:
+    """Test SSE relaying of streamed insights."""
+
+    def test_unexpected_error_ends_with_error_event(self):
+        """Any failure mid-stream should still close the response with an error event."""
+        async def failing_chunks():
+            yield "First block"
+            raise RuntimeError("connection reset")
+
+        async def collect():
+            return [event async for event in insights_event_stream(failing_chunks(), "test.pdf")]
+
+        events = asyncio.run(collect())
+
+        assert events == [
+            "data: First block\n\n",
+            "event: error\ndata: An unexpected error occurred while generating insights\n\n",
+        ]
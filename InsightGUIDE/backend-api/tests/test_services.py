@@ -1,12 +1,26 @@
 """Tests for backend services."""
 
 import asyncio
-from unittest.mock import Mock
+import base64
+from unittest.mock import AsyncMock, Mock, patch
 
+import openai
 import pytest
 
 from exceptions import OCRProcessingError
-from services import OCRService
+from services import APIClientService, FileService, InsightsService, OCRService
+
+
+class _FakeCompletionStream:
+    """Minimal stand-in for openai's AsyncStream: async iteration plus close()."""
+
+    def __init__(self, deltas):
+        self._deltas = deltas
+        self.close = AsyncMock()
+
+    async def __aiter__(self):
+        for delta in self._deltas:
+            yield Mock(choices=[Mock(delta=Mock(content=delta))])
 
 
 def test_ocr_service_rejects_empty_pdf_bytes():
@@ -17,38 +31,157 @@ def test_ocr_service_rejects_empty_pdf_bytes():
         asyncio.run(service.process_pdf("empty.pdf", b""))
 
 
-def test_ocr_service_processes_pdf_and_cleans_up_uploaded_file():
-    """OCR service should process markdown and always delete temporary Mistral files."""
+def test_ocr_service_sends_pdf_inline_without_file_upload():
+    """OCR service should send the PDF as a base64 data URL in a single OCR call."""
     mistral_client = Mock()
-    mistral_client.files.upload.return_value = Mock(id="file_123")
-    mistral_client.files.get_signed_url.return_value = Mock(url="https://example.com/signed-url")
 
     page = Mock()
     page.markdown = "# Extracted content"
     page.images = []
-    mistral_client.ocr.process.return_value = Mock(pages=[page])
+    mistral_client.ocr.process_async = AsyncMock(return_value=Mock(pages=[page]))
 
     service = OCRService(mistral_client)
 
     result = asyncio.run(service.process_pdf("paper.pdf", b"%PDF-1.4\ncontent"))
 
     assert "# Extracted content" in result
-    mistral_client.files.upload.assert_called_once()
-    mistral_client.files.get_signed_url.assert_called_once_with(file_id="file_123", expiry=1)
-    mistral_client.ocr.process.assert_called_once()
-    mistral_client.files.delete.assert_called_once_with(file_id="file_123")
+    mistral_client.ocr.process_async.assert_awaited_once()
+    document = mistral_client.ocr.process_async.call_args.kwargs["document"]
+    assert document.document_url == "data:application/pdf;base64," + base64.b64encode(b"%PDF-1.4\ncontent").decode()
+    assert document.document_name == "paper.pdf"
+    mistral_client.files.upload.assert_not_called()
+    mistral_client.files.delete.assert_not_called()
 
 
-def test_ocr_service_still_cleans_up_when_ocr_fails():
-    """Cleanup should happen even when OCR processing fails."""
+def test_ocr_service_wraps_provider_failures():
+    """Provider errors should surface as OCRProcessingError."""
     mistral_client = Mock()
-    mistral_client.files.upload.return_value = Mock(id="file_456")
-    mistral_client.files.get_signed_url.return_value = Mock(url="https://example.com/signed-url")
-    mistral_client.ocr.process.side_effect = RuntimeError("OCR provider failure")
+    mistral_client.ocr.process_async = AsyncMock(side_effect=RuntimeError("OCR provider failure"))
 
     service = OCRService(mistral_client)
 
     with pytest.raises(OCRProcessingError, match="Failed to process PDF with OCR"):
         asyncio.run(service.process_pdf("paper.pdf", b"%PDF-1.4\ncontent"))
 
-    mistral_client.files.delete.assert_called_once_with(file_id="file_456")
+
+def test_combined_markdown_inlines_images_only_when_requested():
+    """Page markdown is passed through untouched unless inline images are enabled."""
+    page = Mock()
+    page.markdown = "![img-0.jpeg](img-0.jpeg)"
+    page.images = [Mock(id="img-0.jpeg", image_base64="AAA")]
+    ocr_response = Mock(pages=[page, Mock(markdown="Second page", images=[])])
+
+    service = OCRService(Mock())
+
+    assert service.get_combined_markdown(ocr_response) == "![img-0.jpeg](img-0.jpeg)\n\nSecond page"
+    with patch("services.OCR_INCLUDE_IMAGE_BASE64", True):
+        assert service.get_combined_markdown(ocr_response) == (
+            "![img-0.jpeg](data:image/png;base64,AAA)\n\nSecond page"
+        )
+
+
+def test_insights_service_streams_completed_blocks():
+    """Streamed insights should be released per markdown block with URLs fixed."""
+    stream = _FakeCompletionStream(["### Title\n", "\nSee [docs](exa", "mple.com)", None, "", "\n\nEnd"])
+    openai_client = Mock()
+    openai_client.chat.completions.create = AsyncMock(return_value=stream)
+    service = InsightsService(openai_client, Mock(model="test-model", system_prompt="Prompt"))
+
+    async def collect():
+        return [chunk async for chunk in service.stream_insights("# Paper\n\nEnough extracted text to analyse.")]
+
+    chunks = asyncio.run(collect())
+
+    assert chunks == ["### Title\n\n", "See [docs](https://example.com)\n\n", "End"]
+    assert openai_client.chat.completions.create.call_args.kwargs["stream"] is True
+    stream.close.assert_awaited_once()
+
+
+def test_insights_service_closes_stream_when_consumer_stops_early():
+    """Closing the generator mid-stream should close the upstream response too."""
+    stream = _FakeCompletionStream(["First\n\n", "Second\n\n", "Third"])
+    openai_client = Mock()
+    openai_client.chat.completions.create = AsyncMock(return_value=stream)
+    service = InsightsService(openai_client, Mock(model="test-model", system_prompt="Prompt"))
+
+    async def read_first_block():
+        chunks = service.stream_insights("# Paper\n\nEnough extracted text to analyse.")
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first
+
+    assert asyncio.run(read_first_block()) == "First\n\n"
+    stream.close.assert_awaited_once()
+
+
+def test_file_service_saves_extracted_content_async(tmp_path):
+    """Async save should write the markdown next to the configured output dir."""
+    service = FileService(Mock(output_dir=str(tmp_path)))
+
+    output_path = asyncio.run(service.save_extracted_content_async("# Content", "paper.pdf"))
+
+    assert output_path == tmp_path / "extracted_paper.md"
+    assert output_path.read_text(encoding="utf-8") == "# Content"
+
+
+def test_api_client_service_shares_and_closes_http_client(mock_config):
+    """Both SDK clients should use one connection pool that aclose() shuts down."""
+    service = APIClientService(mock_config)
+
+    assert service.openai_client._client is service.http_client
+    assert service.mistral_client.sdk_configuration.async_client is service.http_client
+    assert service.http_client.follow_redirects
+    # The LLM keeps the SDK's own timeout instead of inheriting the OCR timeout
+    assert service.openai_client.timeout == openai.DEFAULT_TIMEOUT
+    assert service.openai_client.timeout.read != mock_config.ocr_timeout_ms / 1000
+
+    asyncio.run(service.aclose())
+
+    assert service.http_client.is_closed
+
+
+def test_insights_service_skips_llm_for_trivial_content():
+    """Empty or near-empty documents should not reach the model."""
+    openai_client = Mock()
+    openai_client.chat.completions.create = AsyncMock()
+    service = InsightsService(openai_client, Mock(model="test-model", system_prompt="Prompt"))
+
+    result = asyncio.run(service.generate_insights("  \n# Title\n  "))
+
+    assert result == "Could not generate insights: the document appears to be empty or unreadable."
+    openai_client.chat.completions.create.assert_not_awaited()
+
+
+def test_insights_service_caches_repeated_content():
+    """Retrying the same document should reuse the earlier insights."""
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = "Insights"
+    openai_client = Mock()
+    openai_client.chat.completions.create = AsyncMock(return_value=response)
+    service = InsightsService(openai_client, Mock(model="test-model", system_prompt="Prompt"))
+
+    content = "# Paper\n\nEnough extracted text to analyse."
+    assert asyncio.run(service.generate_insights(content)) == "Insights"
+    assert asyncio.run(service.generate_insights(content)) == "Insights"
+
+    openai_client.chat.completions.create.assert_awaited_once()
+
+
+def test_insights_service_caches_completed_stream():
+    """A finished stream should be cached so a retry doesn't call the model again."""
+    openai_client = Mock()
+    openai_client.chat.completions.create = AsyncMock(
+        side_effect=lambda **kwargs: _FakeCompletionStream(["Intro\n\n", "See [docs](example.com)"])
+    )
+    service = InsightsService(openai_client, Mock(model="test-model", system_prompt="Prompt"))
+    content = "# Paper\n\nEnough extracted text to analyse."
+
+    async def collect():
+        return [chunk async for chunk in service.stream_insights(content)]
+
+    assert asyncio.run(collect()) == ["Intro\n\n", "See [docs](https://example.com)"]
+    assert asyncio.run(collect()) == ["Intro\n\nSee [docs](https://example.com)"]
+    assert asyncio.run(service.generate_insights(content)) == "Intro\n\nSee [docs](https://example.com)"
+
+    openai_client.chat.completions.create.assert_awaited_once()
@@ -0,0 +1,210 @@
+"""Tests for utility helpers."""
+
+import logging
+from unittest.mock import patch
+
+import utils
+from utils import (
+    _is_pdf_magic,
+    ensure_directory_exists,
+    fix_markdown_urls,
+    format_file_size,
+    has_pdf_signature,
+    replace_images_in_markdown,
+    safe_filename,
+    setup_logging,
+    validate_file_size,
+)
+
+
+class TestReplaceImagesInMarkdown:
+    """Test inline image substitution."""
+
+    def test_replaces_all_known_placeholders(self):
+        """Every placeholder with image data should be inlined in one pass."""
+        markdown = "![img-0.jpeg](img-0.jpeg)\ntext\n![img-1.jpeg](img-1.jpeg)"
+        images = {"img-0.jpeg": "AAA", "img-1.jpeg": "BBB"}
+
+        result = replace_images_in_markdown(markdown, images)
+
+        assert result == (
+            "![img-0.jpeg](data:image/png;base64,AAA)\ntext\n"
+            "![img-1.jpeg](data:image/png;base64,BBB)"
+        )
+
+    def test_leaves_unknown_and_mismatched_images(self):
+        """Images without data, or whose alt text differs from the target, stay as-is."""
+        markdown = "![img-2.jpeg](img-2.jpeg) ![caption](img-0.jpeg)"
+
+        result = replace_images_in_markdown(markdown, {"img-0.jpeg": "AAA"})
+
+        assert result == markdown
+
+    def test_empty_inputs(self):
+        """Empty markdown or image data should short-circuit."""
+        assert replace_images_in_markdown("", {"a": "b"}) == ""
+        assert replace_images_in_markdown("![a](a)", {}) == "![a](a)"
+
+
+class TestFixMarkdownUrls:
+    """Test protocol fixing for markdown links."""
+
+    def test_adds_https_to_bare_domains(self):
+        """Links to bare domains should get an https:// prefix."""
+        result = fix_markdown_urls("See [docs](example.com/page).")
+        assert result == "See [docs](https://example.com/page)."
+
+    def test_bare_domain_with_embedded_url_gets_https(self):
+        """A '://' later in the path or query must not stop a bare domain being fixed."""
+        markdown = (
+            "[a](web.archive.org/web/2020/https://x.org) "
+            "[b](example.com/login?next=https://y.com)"
+        )
+        assert fix_markdown_urls(markdown) == (
+            "[a](https://web.archive.org/web/2020/https://x.org) "
+            "[b](https://example.com/login?next=https://y.com)"
+        )
+
+    def test_leaves_absolute_and_relative_links(self):
+        """Links with a scheme, anchors and paths should be untouched."""
+        markdown = "[a](https://x.org) [b](#section) [c](/local) [d](mailto:me@x.org) [e](notes)"
+        assert fix_markdown_urls(markdown) == markdown
+
+    def test_content_without_links_is_returned_unchanged(self):
+        """Markdown without any link syntax should be returned as the same object."""
+        markdown = "# Title\n\nPlain text mentioning example.com [not a link]."
+        assert fix_markdown_urls(markdown) is markdown
+        assert fix_markdown_urls("") == ""
+
+
+class TestHasPdfSignature:
+    """Test PDF header detection."""
+
+    def test_accepts_header_at_start_or_after_short_preamble(self):
+        """The header may follow a small preamble within the first 1 KiB."""
+        assert has_pdf_signature(b"%PDF-1.7\n...")
+        assert has_pdf_signature(b"\xef\xbb\xbf  \n%PDF-1.4\n...")
+
+    def test_rejects_missing_or_late_header(self):
+        """Files without a header in the first 1 KiB are not PDFs."""
+        assert not has_pdf_signature(b"Not PDF content")
+        assert not has_pdf_signature(b" " * 1024 + b"%PDF-1.4")
+        assert not has_pdf_signature(b"")
+
+    def test_pdf_magic_requires_header_at_offset_zero(self):
+        """The fast-path check only accepts the header as the very first bytes."""
+        assert _is_pdf_magic(b"%PDF-1.7")
+        assert not _is_pdf_magic(b" %PDF-1.7")
+        assert not _is_pdf_magic(b"%PDF")
+
+
+class TestSafeFilename:
+    """Test filename sanitizing."""
+
+    def test_replaces_unsafe_and_drops_control_characters(self):
+        """Unsafe characters become underscores and control characters are removed."""
+        assert safe_filename('a<b>:c"d/e\\f|g?h*.pdf') == "a_b__c_d_e_f_g_h_.pdf"
+        assert safe_filename("re\x00po\x1frt\x7f\x9f.pdf") == "report.pdf"
+
+    def test_strips_and_falls_back(self):
+        """Leading/trailing dots and spaces are stripped; empty results get a placeholder."""
+        assert safe_filename(" .report.pdf. ") == "report.pdf"
+        assert safe_filename("\x01. ") == "unnamed_file"
+        assert safe_filename("") == "unnamed_file"
+        assert len(safe_filename("a" * 300)) == 255
+
+    def test_oversized_input_is_bounded_before_sanitizing(self):
+        """Only a bounded prefix of a huge name is processed."""
+        assert safe_filename("\x00" * 600 + "b" * 1_000_000) == "b" * 255
+
+
+class TestFormatFileSize:
+    """Test human readable file sizes."""
+
+    def test_unit_boundaries(self):
+        """Sizes switch unit at each power of 1024 and cap at TB."""
+        assert format_file_size(0) == "0.0 B"
+        assert format_file_size(1023) == "1023.0 B"
+        assert format_file_size(1024) == "1.0 KB"
+        assert format_file_size(10 * 1024 * 1024) == "10.0 MB"
+        assert format_file_size(3 * 1024 ** 3 // 2) == "1.5 GB"
+        assert format_file_size(2048 * 1024 ** 4) == "2048.0 TB"
+
+    def test_negative_size(self):
+        """Negative sizes are reported as zero."""
+        assert format_file_size(-1) == "0 B"
+
+
+class TestValidateFileSize:
+    """Test the upload size check."""
+
+    def test_size_within_limit(self):
+        """Sizes from zero up to and including the limit are valid."""
+        assert validate_file_size(0, 1024)
+        assert validate_file_size(1024, 1024)
+        assert not validate_file_size(1025, 1024)
+        assert not validate_file_size(-1, 1024)
+
+
+class TestSetupLogging:
+    """Test logging configuration."""
+
+    def test_repeated_calls_only_update_level(self, tmp_path, monkeypatch):
+        """A second call should keep the installed handlers and just change the level."""
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(utils, "_LOGGING_CONFIGURED", False)
+        try:
+            setup_logging("INFO")
+            handlers = root.handlers[:]
+
+            setup_logging("DEBUG")
+
+            assert root.handlers == handlers
+            assert root.level == logging.DEBUG
+        finally:
+            self._restore_root_logger(saved_handlers, saved_level)
+
+    def test_records_are_written_by_the_queue_listener(self, tmp_path, monkeypatch):
+        """Records go through the queue and reach app.log formatted once."""
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(utils, "_LOGGING_CONFIGURED", False)
+        try:
+            setup_logging("INFO")
+            logging.getLogger("insights.test").warning("queued %s", "record")
+            # Stopping the listener drains the queue
+            utils._stop_log_listener()
+
+            log_lines = (tmp_path / "logs" / "app.log").read_text(encoding="utf-8").splitlines()
+            assert log_lines[-1].endswith(" - insights.test - WARNING - queued record")
+            assert log_lines[-1].count(" - WARNING - ") == 1
+        finally:
+            self._restore_root_logger(saved_handlers, saved_level)
+
+    @staticmethod
+    def _restore_root_logger(saved_handlers, saved_level):
+        utils._stop_log_listener()
+        root = logging.getLogger()
+        for handler in root.handlers:
+            if handler not in saved_handlers:
+                handler.close()
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+
+
+class TestEnsureDirectoryExists:
+    """Test directory creation."""
+
+    def test_creates_directory_once(self, tmp_path, monkeypatch):
+        """A directory is created on first use and not touched again afterwards."""
+        monkeypatch.setattr(utils, "_ENSURED_DIRS", set())
+        target = str(tmp_path / "a" / "b")
+
+        assert ensure_directory_exists(target).is_dir()
+
+        with patch("utils.Path.mkdir") as mkdir:
+            assert str(ensure_directory_exists(target)) == target
+        mkdir.assert_not_called()
@@ -1,46 +1,115 @@
 """Utility functions for the InsightGUIDE API."""
 
+import atexit
 import os
+import queue
 import re
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Set
 
 logger = logging.getLogger(__name__)
 
+# Single-pass filename sanitizing: unsafe characters become '_',
+# C0 and C1 control characters are dropped
+_FN_TRANSLATE = str.maketrans({
+    **{c: '_' for c in '<>:"/\\|?*'},
+    **{c: None for c in range(0x00, 0x20)},
+    **{c: None for c in range(0x7f, 0xa0)},
+})
+# Longest filename input that safe_filename will look at
+_MAX_FILENAME_INPUT = 1024
+# Markdown image placeholder emitted by the OCR: ![name](name)
+_IMAGE_RE = re.compile(r'!\[([^\]]*)\]\(([^)]+)\)')
+# Markdown links: [text](url)
+_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+# Bare domain such as example.com/path (no protocol)
+_DOMAIN_RE = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9.-]*\.[a-zA-Z]{2,}')
+# Link targets that already have a protocol or are anchors/absolute paths
+_URL_PREFIXES = ('http://', 'https://', 'ftp://', 'mailto:', '#', '/')
+
+
+# Set once the root handlers are installed, so repeated calls don't reopen app.log
+_LOGGING_CONFIGURED = False
+# Background thread that drains the log queue into the console and file handlers
+_LOG_LISTENER: Optional[QueueListener] = None
+
+
+def _stop_log_listener() -> None:
+    """Flush queued records, stop the listener thread and close its handlers (registered with atexit)."""
+    global _LOG_LISTENER
+    if _LOG_LISTENER is not None:
+        _LOG_LISTENER.stop()
+        for handler in _LOG_LISTENER.handlers:
+            handler.close()
+        _LOG_LISTENER = None
+
 
 def setup_logging(log_level: str = "INFO") -> None:
-    """Configure application logging."""
+    """Configure application logging.
+
+    Records are put on a queue and written by a background listener, so request
+    handlers never block on console or file I/O.
+    """
+    global _LOGGING_CONFIGURED, _LOG_LISTENER
+    
+    level = getattr(logging, log_level.upper())
+    if _LOGGING_CONFIGURED:
+        logging.getLogger().setLevel(level)
+        return
     
     logs_dir = Path("logs")
     logs_dir.mkdir(exist_ok=True)
     
-    logging.basicConfig(
-        level=getattr(logging, log_level.upper()),
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler(logs_dir / "app.log", encoding='utf-8')
-        ]
-    )
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    output_handlers = [
+        logging.StreamHandler(),
+        logging.FileHandler(logs_dir / "app.log", encoding='utf-8')
+    ]
+    for handler in output_handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # The output handlers apply the real format; basicConfig would otherwise
+    # give the queue handler its default format and records would be prefixed twice
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    _LOG_LISTENER = QueueListener(log_queue, *output_handlers, respect_handler_level=True)
+    _LOG_LISTENER.start()
+    atexit.register(_stop_log_listener)
+    
+    logging.basicConfig(level=level, handlers=[queue_handler], force=True)
     
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.getLogger("httpcore").setLevel(logging.WARNING)
     logging.getLogger("openai").setLevel(logging.WARNING)
     
+    _LOGGING_CONFIGURED = True
     logger.info(f"Logging configured with level: {log_level}")
 
 
+# Directories already created or confirmed by ensure_directory_exists in this process
+_ENSURED_DIRS: Set[str] = set()
+
+
 def ensure_directory_exists(directory: str) -> Path:
     """Ensure a directory exists, create if it doesn't."""
+    if directory in _ENSURED_DIRS:
+        return Path(directory)
+    
     try:
         path = Path(directory)
         path.mkdir(parents=True, exist_ok=True)
         logger.debug(f"Ensured directory exists: {path}")
-        return path
     except Exception as e:
         logger.error(f"Failed to create directory {directory}: {e}")
         raise OSError(f"Failed to create directory {directory}: {e}")
+    
+    # Set.add is atomic under the GIL; a racing duplicate mkdir is harmless
+    _ENSURED_DIRS.add(directory)
+    return path
 
 
 def safe_filename(filename: str) -> str:
@@ -48,8 +117,10 @@ def safe_filename(filename: str) -> str:
     if not filename:
         return "unnamed_file"
         
-    safe_name = re.sub(r'[<>:"/\\|?*]', '_', filename)  # Remove or replace unsafe characters
-    safe_name = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', safe_name)  # Remove control characters
+    # Bound the input first so oversized names aren't sanitized in full; leaves
+    # headroom over the 255 limit for characters that strip/translate remove
+    safe_name = filename[:_MAX_FILENAME_INPUT]
+    safe_name = safe_name.translate(_FN_TRANSLATE)  # Replace unsafe and drop control characters
     safe_name = safe_name.strip('. ')  # Remove leading/trailing whitespace and dots
     safe_name = safe_name[:255]  # Limit length
     
@@ -62,33 +133,57 @@ def replace_images_in_markdown(markdown_str: str, images_dict: Dict[str, str]) -
     """Replace image placeholders in markdown with base64-encoded images."""
     if not markdown_str:
         return ""
-        
-    for img_name, base64_str in images_dict.items():
-        if img_name and base64_str:
-            markdown_str = markdown_str.replace(
-                f"![{img_name}]({img_name})", 
-                f"![{img_name}](data:image/png;base64,{base64_str})"
-            )
-    return markdown_str
+    if not images_dict or "![" not in markdown_str:
+        return markdown_str
+
+    def swap_image(match: re.Match) -> str:
+        img_name = match.group(1)
+        if img_name != match.group(2):
+            return match.group(0)
+        base64_str = images_dict.get(img_name)
+        if not img_name or not base64_str:
+            return match.group(0)
+        return f"![{img_name}](data:image/png;base64,{base64_str})"
+
+    return _IMAGE_RE.sub(swap_image, markdown_str)
+
+
+PDF_SIGNATURE = b'%PDF-'
+# The PDF spec tolerates arbitrary bytes before the header within the first 1 KiB
+PDF_SIGNATURE_WINDOW = 1024
+
+
+def _is_pdf_magic(head: bytes) -> bool:
+    """Check for the PDF header at offset 0, the layout nearly every PDF uses."""
+    return head[:5] == PDF_SIGNATURE
+
+
+def has_pdf_signature(head: bytes) -> bool:
+    """Check whether the leading bytes of a file contain the PDF header."""
+    if _is_pdf_magic(head):
+        return True
+    return PDF_SIGNATURE in head[:PDF_SIGNATURE_WINDOW]
 
 
 def validate_file_size(file_size: int, max_size: int) -> bool:
     """Validate file size against maximum allowed size."""
-    if file_size < 0 or max_size < 0:
-        return False
-    return file_size <= max_size
+    # max_size itself is validated once when Config is built
+    return 0 <= file_size <= max_size
+
+
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
 
 
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human readable format."""
     if size_bytes < 0:
         return "0 B"
-        
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.1f} TB"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    
+    # Each unit spans 10 bits, so the bit length picks the unit without a divide loop
+    idx = min((int(size_bytes).bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (idx * 10)):.1f} {_SIZE_UNITS[idx]}"
 
 
 def fix_markdown_urls(markdown_content: str) -> str:
@@ -104,34 +199,25 @@ def fix_markdown_urls(markdown_content: str) -> str:
     Returns:
         Markdown content with fixed URLs
     """
-    import re
-    
-    if not markdown_content:
+    if not markdown_content or "](" not in markdown_content:
         return markdown_content
     
-    # Pattern to match markdown links: [text](url)
-    # This matches [anything](domain.tld/path) where domain.tld doesn't start with http/https
-    link_pattern = r'\[([^\]]+)\]\(([^)]+)\)'
-    
     def fix_url(match):
-        text = match.group(1)
         url = match.group(2)
         
-        if url.startswith(('http://', 'https://', 'ftp://', 'mailto:', '#', '/')):
+        if url.startswith(_URL_PREFIXES):
             return match.group(0)
         
         # Check if it looks like a domain (contains a dot and common TLD patterns)
-        domain_pattern = r'^[a-zA-Z0-9][a-zA-Z0-9.-]*\.[a-zA-Z]{2,}'
-        
-        if re.match(domain_pattern, url):
+        if _DOMAIN_RE.match(url):
             # Add https:// protocol
             fixed_url = f"https://{url}"
             logger.debug(f"Fixed URL: {url} -> {fixed_url}")
-            return f"[{text}]({fixed_url})"
+            return f"[{match.group(1)}]({fixed_url})"
         
         # Return original if it doesn't look like a domain
         return match.group(0)
     
-    fixed_content = re.sub(link_pattern, fix_url, markdown_content)
+    fixed_content = _LINK_RE.sub(fix_url, markdown_content)
     
     return fixed_content